@@ -53,5 +53,5 @@ Por favor, genera tu análisis ahora.
         return response.content[0].text
 
     except Exception as e:
-        logger.error(f"Error generando análisis de patrones: {e}")
+        logger.error("Error generando análisis de patrones: %s", e)
         return f"❌ Hubo un error procesando el análisis: {str(e)[:150]}"
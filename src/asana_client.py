@@ -1,20 +1,276 @@
 """Cliente de Asana con auto-discovery de GIDs."""
 
+import atexit
+import copy
+import functools
 import json
 import hashlib
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date, timezone
+from typing import NamedTuple
 
 import asana
+from asana.rest import ApiException
 from pathlib import Path
+
 from .config import (
     ASANA_ACCESS_TOKEN,
     ASANA_PROJECT_GID,
     ASANA_IDS_FILE,
     ASANA_WORKSPACE_GID,
+    EMOJI_PRIORIDAD,
     PROCESADOS_FILE,
+    PROCESADOS_LOG_FILE,
+    PROCESADOS_COMPACTAR_CADA,
     PRIORIDAD_SECCION_MAP,
+    TZ_BA,
     logger,
 )
+from .jsonio import guardar_json_atomico, json_dumps, json_loads
+
+# Versión del formato de asana_ids.json (2: incluye owner_user_gid)
+_IDS_SCHEMA_VERSION = 2
+
+# Tamaño de página máximo que acepta Asana: menos round-trips al paginar
+_PAGE_LIMIT = 100
+
+# Segundos que se reutiliza el listado de una sección sin volver a pedirlo
+_TAREAS_CACHE_TTL = 60.0
+
+# Rate limit de Asana por usuario, y reintentos ante un 429
+_ASANA_REQUESTS_POR_MIN = 100
+_ASANA_MAX_REINTENTOS = 3
+
+# opt_fields del discovery: mantener en sync con lo que lee discover_asana_ids
+_USER_OPT_FIELDS = "gid,name,email,workspaces"
+_SECTIONS_OPT_FIELDS = "name,gid"
+_PROJECT_OPT_FIELDS = (
+    "custom_field_settings.custom_field.name,"
+    "custom_field_settings.custom_field.gid,"
+    "custom_field_settings.custom_field.enum_options"
+)
+
+
+class TareaResumen(NamedTuple):
+    """Tarea pendiente tal como se lista en /hoy, /semana y /done."""
+
+    gid: str
+    emoji_prioridad: str
+    proyecto: str
+    name: str
+    seccion: str
+
+
+@functools.lru_cache(maxsize=8)
+def _read_ids_cached(path_str: str, mtime_ns: int) -> dict:
+    """Lee y parsea asana_ids.json, memoizado por (ruta, mtime)."""
+    return json_loads(Path(path_str).read_bytes())
+
+
+def _indice_por_sufijo(nombres: dict[str, str]) -> dict[str, str]:
+    """
+    Indexa cada GID por su nombre completo y por cada sufijo tras un espacio,
+    para resolver en O(1) nombres con emoji como "🔥 Hoy" a partir de "Hoy".
+    El match exacto tiene prioridad; entre sufijos gana el primero.
+    """
+    indice: dict[str, str] = {}
+    for nombre, gid in nombres.items():
+        pos = nombre.find(" ")
+        while pos != -1:
+            indice.setdefault(nombre[pos + 1:], gid)
+            pos = nombre.find(" ", pos + 1)
+    indice.update(nombres)
+    return indice
+
+
+def _normalizar_nombre_proyecto(raw: str) -> str:
+    """Quita el prefijo emoji de una opción ("🎤 Speaker" → "Speaker")."""
+    first = raw[:1]
+    if first and not first.isalnum():
+        _, sep, rest = raw.partition(" ")
+        if sep:
+            return rest
+    return raw
+
+
+def _parse_notes_fields(notas: str) -> tuple[str | None, str | None]:
+    """
+    Extrae en una sola pasada las líneas "Proyecto:" y "Prioridad:" de las notas.
+
+    Returns:
+        (proyecto, emoji_prioridad), con None en los campos que no aparezcan
+    """
+    proyecto = None
+    emoji_prioridad = None
+    for line in notas.splitlines():
+        # Ambas claves empiezan con "P": descarta el resto sin particionar
+        if line[:1] != "P":
+            continue
+        if proyecto is None:
+            head, sep, tail = line.partition("Proyecto:")
+            if sep and not head:
+                proyecto = tail.strip()
+        if emoji_prioridad is None:
+            head, sep, tail = line.partition("Prioridad:")
+            if sep and not head:
+                rest = tail.strip()
+                emoji_prioridad = rest.split(maxsplit=1)[0] if rest else ""
+        if proyecto is not None and emoji_prioridad is not None:
+            break
+    return proyecto, emoji_prioridad
+
+
+class _TokenBucket:
+    """
+    Limitador token bucket thread-safe.
+
+    `acquire()` bloquea hasta que haya un token disponible, así las ráfagas
+    se espacian en vez de rebotar con 429.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (ahora - self._ultimo) * self._rate
+                )
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self._rate
+            time.sleep(espera)
+
+
+# Bucket compartido por todo el proceso (el límite es por usuario, no por cliente)
+_asana_bucket = _TokenBucket(rate=_ASANA_REQUESTS_POR_MIN / 60, capacity=_ASANA_REQUESTS_POR_MIN)
+
+
+def _retry_after(e: ApiException, intento: int) -> float:
+    """Segundos a esperar tras un 429: Retry-After si viene, si no backoff exponencial."""
+    try:
+        return float((e.headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        return 2.0 ** intento
+
+
+class _RegistroProcesados:
+    """
+    Mensajes ya procesados: set en memoria + log append-only en disco.
+
+    Lee el formato legacy (`procesados.json`, array JSON o un ID por línea)
+    y el log `procesados.log`. El legacy se migra al log en la primera
+    escritura, y el log se compacta cada PROCESADOS_COMPACTAR_CADA altas.
+    """
+
+    def __init__(self):
+        self._ids: set[str] = set()
+        self._migrar_legacy = False
+        self._desde_compactacion = 0
+
+        try:
+            raw = PROCESADOS_FILE.read_bytes().strip()
+        except FileNotFoundError:
+            raw = None
+
+        if raw is not None:
+            self._migrar_legacy = True
+            try:
+                self._ids.update(json_loads(raw or b"[]"))
+            except json.JSONDecodeError:
+                self._ids.update(
+                    line for line in raw.decode("utf-8").splitlines() if line
+                )
+
+        # Una sola pasada línea a línea, sin materializar el archivo entero
+        try:
+            with open(PROCESADOS_LOG_FILE, encoding="utf-8") as f:
+                for line in f:
+                    message_id = line.strip()
+                    if message_id:
+                        self._ids.add(message_id)
+        except FileNotFoundError:
+            pass
+
+        logger.info("✅ %s mensajes procesados cargados", len(self._ids))
+
+        # Handle persistente con line buffering: cada alta es un solo write()
+        self._fh = self._abrir_log()
+        # Los handlers crean tareas desde worker threads: altas y compactación
+        # no pueden intercalarse sobre el mismo handle
+        self._lock = threading.Lock()
+        atexit.register(self._cerrar_log)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._ids
+
+    def _abrir_log(self):
+        """Abre el log de procesados en modo append, con line buffering."""
+        return open(PROCESADOS_LOG_FILE, "a", buffering=1, encoding="utf-8")
+
+    def _cerrar_log(self):
+        """Cierra el handle del log de procesados (registrado en atexit)."""
+        if not self._fh.closed:
+            self._fh.close()
+
+    def marcar(self, message_ids: list[str]):
+        """Agrega IDs al set y los escribe al log con un único write."""
+        if not message_ids:
+            return
+
+        with self._lock:
+            self._ids.update(message_ids)
+
+            if self._migrar_legacy:
+                self._compactar()
+                return
+
+            self._fh.write("".join(f"{mid}\n" for mid in message_ids))
+
+            self._desde_compactacion += len(message_ids)
+            if self._desde_compactacion >= PROCESADOS_COMPACTAR_CADA:
+                self._compactar()
+
+    def _compactar(self):
+        """Reescribe el log completo desde el set y elimina el archivo legacy (con el lock tomado)."""
+        tmp = PROCESADOS_LOG_FILE.with_suffix(".log.tmp")
+        with open(tmp, "wb", buffering=0) as f:
+            f.write("".join(f"{mid}\n" for mid in sorted(self._ids)).encode("utf-8"))
+        tmp.replace(PROCESADOS_LOG_FILE)
+
+        # El handle abierto apunta al archivo reemplazado: reabrir
+        self._cerrar_log()
+        self._fh = self._abrir_log()
+
+        if self._migrar_legacy:
+            PROCESADOS_FILE.unlink(missing_ok=True)
+            self._migrar_legacy = False
+            logger.info("✅ procesados.json migrado a %s", PROCESADOS_LOG_FILE)
+
+        self._desde_compactacion = 0
+
+
+def _dedup_id(fuente: str, message_id: str) -> str:
+    """Clave de deduplicación de un mensaje: "{fuente}_{message_id}"."""
+    return f"{fuente}_{message_id}"
+
+
+@functools.lru_cache(maxsize=1)
+def _registro_procesados() -> _RegistroProcesados:
+    """Registro de procesados compartido por todos los AsanaClient del proceso."""
+    return _RegistroProcesados()
 
 
 class AsanaClient:
@@ -29,73 +285,154 @@ class AsanaClient:
         self.projects_api = asana.ProjectsApi(api_client)
         self.users_api = asana.UsersApi(api_client)
 
+        # Cache de listar_tareas_seccion: seccion_gid → (timestamp, tareas)
+        self._tasks_cache: dict[str, tuple[float, list[TareaResumen]]] = {}
+
         self.ids = self._load_or_discover_ids()
+        self._construir_indices()
         self._init_procesados()
 
+    # ──────────────────────────────────────────────
+    # Llamadas a la API con rate limit
+    # ──────────────────────────────────────────────
+
+    def _call(self, fn, *args, **kwargs):
+        """
+        Ejecuta una llamada al SDK de Asana respetando el rate limit.
+
+        Toma un token del bucket antes de cada intento; ante un 429 espera lo
+        que indique Retry-After (o backoff exponencial) y reintenta.
+        """
+        for intento in range(_ASANA_MAX_REINTENTOS + 1):
+            _asana_bucket.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except ApiException as e:
+                if e.status != 429 or intento == _ASANA_MAX_REINTENTOS:
+                    raise
+                espera = _retry_after(e, intento)
+                logger.warning("⚠️ Rate limit de Asana (429), reintentando en %.0fs", espera)
+                time.sleep(espera)
+
+    def _listar(self, fn, gid: str, opts: dict) -> list:
+        """
+        Trae todas las páginas de un endpoint paginado (fn(gid, opts)).
+
+        Cada página es una llamada propia a _call: consume su token del bucket
+        y un 429 reintenta solo esa página, sin volver a pedir las anteriores.
+        """
+        items: list = []
+        opts_pagina = dict(opts)
+        while True:
+            pagina = self._call(fn, gid, dict(opts_pagina), full_payload=True)
+            items.extend(pagina.get("data") or [])
+            next_page = pagina.get("next_page")
+            if not next_page:
+                return items
+            opts_pagina["offset"] = next_page["offset"]
+
     def _resolver_seccion_gid_por_nombre_corto(self, nombre_corto: str) -> str | None:
         """Resuelve el GID de una sección a partir de un nombre simple ("Hoy", "Semana")."""
-        secciones = self.ids.get("secciones", {}) or {}
-
-        # Match exacto
-        gid = secciones.get(nombre_corto)
+        gid = self._seccion_index.get(nombre_corto)
         if gid:
             return gid
 
-        # Match por sufijo, para nombres con emoji como "🔥 Hoy"
-        for nombre_seccion, sgid in secciones.items():
-            if nombre_seccion.endswith(f" {nombre_corto}"):
-                return sgid
-
-        logger.warning(f"⚠️ No se encontró sección en Asana para nombre '{nombre_corto}'")
+        logger.warning("⚠️ No se encontró sección en Asana para nombre '%s'", nombre_corto)
         return None
+
+    def _construir_indices(self):
+        """Precalcula los índices nombre → GID a partir de self.ids."""
+        self._campo_proyecto_gid = self.ids.get("campo_proyecto_gid")
+        self._seccion_index = _indice_por_sufijo(self.ids.get("secciones", {}) or {})
+        # Incluye nombres con emoji como "🎤 Speaker"
+        self._opcion_proyecto_index = _indice_por_sufijo(
+            self.ids.get("opciones_proyecto", {}) or {}
+        )
+
+    def _construir_custom_fields(self, clasificacion: dict) -> dict:
+        """Arma el dict de custom fields (campo "Proyecto") para una clasificación."""
+        custom_fields = {}
+        campo_gid = self._campo_proyecto_gid
+        if campo_gid:
+            proyecto = clasificacion.get("proyecto", "Personal")
+            opcion_gid = self._opcion_proyecto_index.get(proyecto)
+
+            if opcion_gid:
+                custom_fields[campo_gid] = opcion_gid
+            else:
+                logger.warning(
+                    "⚠️ No se encontró opción de custom field 'Proyecto' para valor '%s'",
+                    proyecto,
+                )
+        return custom_fields
+
     # ──────────────────────────────────────────────
     # Auto-discovery de IDs
     # ──────────────────────────────────────────────
 
+    @contextmanager
+    def _ids_transaction(self, ids: dict | None = None):
+        """
+        Agrupa las modificaciones sobre un dict de IDs y las persiste una sola vez.
+
+        Al salir sin error, si el contenido cambió, se escribe asana_ids.json
+        con un único write atómico. Si hay una excepción no se escribe nada.
+        """
+        ids = {} if ids is None else ids
+        antes = copy.deepcopy(ids)
+        yield ids
+        if ids != antes:
+            guardar_json_atomico(ASANA_IDS_FILE, ids)
+
     def _load_or_discover_ids(self) -> dict:
         """Carga IDs cacheados o los descubre via API."""
-        if ASANA_IDS_FILE.exists():
-            ids = json.loads(ASANA_IDS_FILE.read_text(encoding="utf-8"))
+        try:
+            mtime_ns = ASANA_IDS_FILE.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        if mtime_ns is not None:
+            ids = copy.deepcopy(_read_ids_cached(str(ASANA_IDS_FILE), mtime_ns))
             logger.info("✅ IDs de Asana cargados desde cache")
 
-            # Migración: asegurar que exista owner_user_gid
-            if not ids.get("owner_user_gid"):
+            # Migración one-shot: asegurar que exista owner_user_gid.
+            # Una vez migrado, _schema_version evita volver a chequear.
+            if ids.get("_schema_version", 1) < _IDS_SCHEMA_VERSION:
                 try:
-                    ids = self._descubrir_owner_user_gid(ids)
-                    ASANA_IDS_FILE.write_text(
-                        json.dumps(ids, indent=2, ensure_ascii=False),
-                        encoding="utf-8",
-                    )
-                    logger.info("✅ owner_user_gid agregado a asana_ids.json")
+                    with self._ids_transaction(ids):
+                        if not ids.get("owner_user_gid"):
+                            self._descubrir_owner_user_gid(ids)
+                        if ids.get("owner_user_gid"):
+                            ids["_schema_version"] = _IDS_SCHEMA_VERSION
+                            logger.info("✅ asana_ids.json migrado (owner_user_gid)")
                 except Exception as e:
-                    logger.error(f"❌ No se pudo actualizar owner_user_gid desde cache: {e}")
+                    logger.error("❌ No se pudo actualizar owner_user_gid desde cache: %s", e)
 
             return ids
 
         logger.info("🔍 Descubriendo IDs de Asana via API...")
-        ids = self.discover_asana_ids()
-        ASANA_IDS_FILE.write_text(
-            json.dumps(ids, indent=2, ensure_ascii=False),
-            encoding="utf-8",
-        )
-        logger.info(f"✅ IDs descubiertos y guardados en {ASANA_IDS_FILE}")
+        with self._ids_transaction() as ids:
+            ids.update(self.discover_asana_ids())
+        logger.info("✅ IDs descubiertos y guardados en %s", ASANA_IDS_FILE)
         return ids
 
     def _descubrir_owner_user_gid(self, ids: dict) -> dict:
         """Completa owner_user_gid en el dict de IDs."""
         try:
-            me = self.users_api.get_user(
+            me = self._call(
+                self.users_api.get_user,
                 "me",
-                {
-                    "opt_fields": "gid,name,email,workspaces",
-                },
+                {"opt_fields": _USER_OPT_FIELDS},
             )
             workspaces = me.get("workspaces", [])
             if any(ws.get("gid") == ASANA_WORKSPACE_GID for ws in workspaces):
                 ids["owner_user_gid"] = me["gid"]
                 logger.info(
-                    f"  Owner detectado para workspace {ASANA_WORKSPACE_GID}: "
-                    f"{me.get('name')} ({me.get('email', 'sin email')}) → {me['gid']}"
+                    "  Owner detectado para workspace %s: %s (%s) → %s",
+                    ASANA_WORKSPACE_GID,
+                    me.get("name"),
+                    me.get("email", "sin email"),
+                    me["gid"],
                 )
             else:
                 ids["owner_user_gid"] = me["gid"]
@@ -104,89 +441,100 @@ class AsanaClient:
                     "pero se usará igualmente como owner por defecto"
                 )
         except Exception as e:
-            logger.error(f"❌ No se pudo descubrir owner_user_gid: {e}")
+            logger.error("❌ No se pudo descubrir owner_user_gid: %s", e)
         return ids
 
     def discover_asana_ids(self) -> dict:
         """Descubre secciones, custom fields y user GIDs relevantes."""
         ids = {
+            "_schema_version": _IDS_SCHEMA_VERSION,
             "secciones": {},
             "campo_proyecto_gid": None,
             "opciones_proyecto": {},
             "owner_user_gid": None,
         }
 
-        # 1. Obtener secciones
-        secciones = self.sections_api.get_sections_for_project(
-            ASANA_PROJECT_GID,
-            {
-                "opt_fields": "name,gid",
-            },
-        )
-        for seccion in secciones:
+        # Las tres consultas son independientes: se lanzan en paralelo
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            f_secciones = executor.submit(
+                self._listar,
+                self.sections_api.get_sections_for_project,
+                ASANA_PROJECT_GID,
+                {"opt_fields": _SECTIONS_OPT_FIELDS},
+            )
+            f_project = executor.submit(
+                self._call,
+                self.projects_api.get_project,
+                ASANA_PROJECT_GID,
+                {"opt_fields": _PROJECT_OPT_FIELDS},
+            )
+            # Completa ids["owner_user_gid"] y loguea sus propios errores
+            f_owner = executor.submit(self._descubrir_owner_user_gid, ids)
+
+        # 1. Secciones (sin secciones no hay nada útil que guardar: se propaga)
+        for seccion in f_secciones.result():
             ids["secciones"][seccion["name"]] = seccion["gid"]
-            logger.info(f"  Sección: {seccion['name']} → {seccion['gid']}")
+            logger.info("  Sección: %s → %s", seccion["name"], seccion["gid"])
 
-        # 2. Obtener custom fields del proyecto
-        project = self.projects_api.get_project(
-            ASANA_PROJECT_GID,
-            {
-                "opt_fields": (
-                    "custom_field_settings.custom_field.name,"
-                    "custom_field_settings.custom_field.gid,"
-                    "custom_field_settings.custom_field.enum_options"
-                )
-            },
-        )
+        # 2. Custom fields del proyecto
+        try:
+            project = f_project.result()
+        except Exception as e:
+            logger.error("❌ No se pudieron obtener los custom fields del proyecto: %s", e)
+            project = {}
 
         for setting in project.get("custom_field_settings", []):
             cf = setting.get("custom_field", {})
             if cf.get("name") == "Proyecto":
                 ids["campo_proyecto_gid"] = cf["gid"]
-                logger.info(f"  Campo 'Proyecto' GID: {cf['gid']}")
+                logger.info("  Campo 'Proyecto' GID: %s", cf["gid"])
 
                 for opcion in cf.get("enum_options", []):
                     if opcion.get("enabled", True):
                         ids["opciones_proyecto"][opcion["name"]] = opcion["gid"]
-                        logger.info(f"    Opción: {opcion['name']} → {opcion['gid']}")
+                        logger.info("    Opción: %s → %s", opcion["name"], opcion["gid"])
                 break
 
         if not ids["campo_proyecto_gid"]:
             logger.warning("⚠️ No se encontró el campo 'Proyecto' en Asana")
 
-        # 3. Descubrir user GID del owner del workspace (Ivan)
-        ids = self._descubrir_owner_user_gid(ids)
+        # 3. User GID del owner del workspace (Ivan)
+        f_owner.result()
 
         return ids
 
     def refresh_ids(self):
         """Fuerza re-discovery de IDs (útil si cambia algo en Asana)."""
-        if ASANA_IDS_FILE.exists():
-            ASANA_IDS_FILE.unlink()
+        ASANA_IDS_FILE.unlink(missing_ok=True)
+        _read_ids_cached.cache_clear()
         self.ids = self._load_or_discover_ids()
+        self._construir_indices()
+        self._invalidar_cache_tareas()
 
     # ──────────────────────────────────────────────
     # Deduplicación
     # ──────────────────────────────────────────────
 
     def _init_procesados(self):
-        """Inicializa archivo de mensajes procesados."""
-        if not PROCESADOS_FILE.exists():
-            PROCESADOS_FILE.write_text("[]", encoding="utf-8")
+        """Toma el registro de procesados del proceso (se carga una sola vez)."""
+        self._procesados = _registro_procesados()
 
     def _ya_procesado(self, message_id: str) -> bool:
         """Verifica si un mensaje ya fue procesado."""
-        procesados = json.loads(PROCESADOS_FILE.read_text(encoding="utf-8"))
-        return message_id in procesados
+        return message_id in self._procesados
+
+    def ya_procesado(self, message_id: str, fuente: str = "telegram") -> bool:
+        """
+        Indica si un mensaje de Telegram ya generó una tarea.
+
+        Permite cortar antes de transcribir/clasificar cuando Telegram
+        reenvía un update que ya se procesó.
+        """
+        return self._ya_procesado(_dedup_id(fuente, message_id))
 
     def _marcar_procesado(self, message_id: str):
-        """Marca un mensaje como procesado."""
-        procesados = json.loads(PROCESADOS_FILE.read_text(encoding="utf-8"))
-        procesados.append(message_id)
-        PROCESADOS_FILE.write_text(
-            json.dumps(procesados, ensure_ascii=False),
-            encoding="utf-8",
-        )
+        """Marca un mensaje como procesado (append de una línea al log)."""
+        self._procesados.marcar([message_id])
 
     # ──────────────────────────────────────────────
     # Crear tarea
@@ -206,9 +554,9 @@ class AsanaClient:
             Task dict de Asana, o None si ya fue procesado
         """
         # Dedup check
-        dedup_id = f"{fuente}_{message_id}"
+        dedup_id = _dedup_id(fuente, message_id)
         if self._ya_procesado(dedup_id):
-            logger.info(f"⏭️ Mensaje {dedup_id} ya procesado, saltando")
+            logger.info("⏭️ Mensaje %s ya procesado, saltando", dedup_id)
             return None
 
         # Determinar sección según prioridad
@@ -218,9 +566,7 @@ class AsanaClient:
         seccion_gid = self._resolver_seccion_gid_por_nombre_corto(nombre_seccion)
 
         # Construir notas
-        emoji_prioridad = {"alta": "🔴", "media": "🟡", "baja": "🟢"}.get(
-            clasificacion.get("prioridad"), "⚪"
-        )
+        emoji_prioridad = EMOJI_PRIORIDAD.get(clasificacion.get("prioridad"), "⚪")
         notas = (
             f"Fuente: {fuente}\n"
             f"Tipo: {clasificacion.get('tipo', 'nota')}\n"
@@ -231,28 +577,7 @@ class AsanaClient:
         )
 
         # Construir custom fields
-        custom_fields = {}
-        campo_gid = self.ids.get("campo_proyecto_gid")
-        if campo_gid:
-            proyecto = clasificacion.get("proyecto", "Personal")
-            opciones = self.ids.get("opciones_proyecto", {}) or {}
-
-            # Primero intentamos match exacto
-            opcion_gid = opciones.get(proyecto)
-
-            # Si no hay, intentamos hacer match por sufijo (para nombres con emoji como "🎤 Speaker")
-            if not opcion_gid:
-                for nombre_opcion, gid in opciones.items():
-                    if nombre_opcion.endswith(f" {proyecto}"):
-                        opcion_gid = gid
-                        break
-
-            if opcion_gid:
-                custom_fields[campo_gid] = opcion_gid
-            else:
-                logger.warning(
-                    f"⚠️ No se encontró opción de custom field 'Proyecto' para valor '{proyecto}'"
-                )
+        custom_fields = self._construir_custom_fields(clasificacion)
 
         # ──────────────────────────────────────────────
         # Crear tarea
@@ -263,10 +588,18 @@ class AsanaClient:
             task_data = {
                 "name": clasificacion.get("resumen", texto[:80]),
                 "notes": notas,
-                "projects": [ASANA_PROJECT_GID],
                 "custom_fields": custom_fields,
             }
 
+            # Crear directamente en la sección correcta vía "memberships":
+            # evita un segundo round-trip a add_task_for_section
+            if seccion_gid:
+                task_data["memberships"] = [
+                    {"project": ASANA_PROJECT_GID, "section": seccion_gid}
+                ]
+            else:
+                task_data["projects"] = [ASANA_PROJECT_GID]
+
             # Asignar owner (si lo tenemos cacheado)
             owner_gid = self.ids.get("owner_user_gid")
             if owner_gid:
@@ -278,26 +611,19 @@ class AsanaClient:
                 task_data["due_on"] = due_date
 
             body = {"data": task_data}
-            task = self.tasks_api.create_task(body, {})
-            logger.info(f"✅ Tarea creada: {task['gid']} - {task['name']}")
-
-            # Mover a sección correcta
+            task = self._call(self.tasks_api.create_task, body, {})
+            logger.info("✅ Tarea creada: %s - %s", task["gid"], task["name"])
             if seccion_gid:
-                self.sections_api.add_task_for_section(
-                    seccion_gid,
-                    {
-                        "body": {"data": {"task": task["gid"]}},
-                    },
-                )
-                logger.info(f"  → Movida a sección: {nombre_seccion}")
+                logger.info("  → En sección: %s", nombre_seccion)
 
             # Marcar como procesado
             self._marcar_procesado(dedup_id)
+            self._invalidar_cache_tareas(seccion_gid)
 
             return task
 
         except Exception as e:
-            logger.error(f"❌ Error creando tarea en Asana: {e}")
+            logger.error("❌ Error creando tarea en Asana: %s", e)
             raise
 
     def actualizar_tarea(self, task_gid: str, clasificacion: dict) -> dict | None:
@@ -311,34 +637,14 @@ class AsanaClient:
         seccion_gid = self._resolver_seccion_gid_por_nombre_corto(nombre_seccion)
 
         # Construir custom fields
-        custom_fields = {}
-        campo_gid = self.ids.get("campo_proyecto_gid")
-        if campo_gid:
-            proyecto = clasificacion.get("proyecto", "Personal")
-            opciones = self.ids.get("opciones_proyecto", {}) or {}
-
-            opcion_gid = opciones.get(proyecto)
-            if not opcion_gid:
-                for nombre_opcion, gid in opciones.items():
-                    if nombre_opcion.endswith(f" {proyecto}"):
-                        opcion_gid = gid
-                        break
-
-            if opcion_gid:
-                custom_fields[campo_gid] = opcion_gid
-            else:
-                logger.warning(
-                    f"⚠️ No se encontró opción de custom field 'Proyecto' para valor '{proyecto}'"
-                )
+        custom_fields = self._construir_custom_fields(clasificacion)
 
         try:
             # Recuperar notas viejas para preservar el texto original
-            existing_task = self.tasks_api.get_task(task_gid, {"opt_fields": "notes"})
+            existing_task = self._call(self.tasks_api.get_task, task_gid, {"opt_fields": "notes"})
             old_notes = existing_task.get("notes", "")
 
-            emoji_prioridad = {"alta": "🔴", "media": "🟡", "baja": "🟢"}.get(
-                clasificacion.get("prioridad"), "⚪"
-            )
+            emoji_prioridad = EMOJI_PRIORIDAD.get(clasificacion.get("prioridad"), "⚪")
 
             # Preservar el texto original (lo que está después de "---")
             if "---" in old_notes:
@@ -369,105 +675,100 @@ class AsanaClient:
                 task_data["due_on"] = None
 
             body = {"data": task_data}
-            task = self.tasks_api.update_task(body, task_gid, {})
-            logger.info(f"✅ Tarea actualizada: {task['gid']} - {task['name']}")
+            task = self._call(self.tasks_api.update_task, body, task_gid, {})
+            logger.info("✅ Tarea actualizada: %s - %s", task["gid"], task["name"])
 
             # Mover a sección correcta si es posible
             if seccion_gid:
-                self.sections_api.add_task_for_section(
+                self._call(
+                    self.sections_api.add_task_for_section,
                     seccion_gid,
                     {
                         "body": {"data": {"task": task["gid"]}},
                     },
                 )
-                logger.info(f"  → Movida a sección: {nombre_seccion}")
+                logger.info("  → Movida a sección: %s", nombre_seccion)
+
+            # Puede haber cambiado de sección: se invalida todo
+            self._invalidar_cache_tareas()
 
             return task
 
         except Exception as e:
-            logger.error(f"❌ Error actualizando tarea {task_gid} en Asana: {e}")
+            logger.error("❌ Error actualizando tarea %s en Asana: %s", task_gid, e)
             raise
 
     # ──────────────────────────────────────────────
     # Consultar tareas por sección
     # ──────────────────────────────────────────────
 
-    def listar_tareas_seccion(self, nombre_seccion_corto: str) -> list[dict]:
+    def listar_tareas_seccion(self, nombre_seccion_corto: str) -> list[TareaResumen]:
         """
         Devuelve tareas no completadas de una sección dada ("Hoy", "Semana").
 
-        Retorna una lista de dicts:
-            {
-                "emoji_prioridad": str,
-                "proyecto": str,
-                "name": str,
-            }
+        Retorna una lista de TareaResumen (gid, emoji_prioridad, proyecto, name, seccion).
         """
         seccion_gid = self._resolver_seccion_gid_por_nombre_corto(nombre_seccion_corto)
         if not seccion_gid:
             return []
 
-        tareas = []
+        # Cache en memoria por sección, con TTL corto
+        now = time.monotonic()
+        hit = self._tasks_cache.get(seccion_gid)
+        if hit and now - hit[0] < _TAREAS_CACHE_TTL:
+            return list(hit[1])
+
+        tareas: list[TareaResumen] = []
         opts = {
+            "limit": _PAGE_LIMIT,
             "opt_fields": (
                 "name,completed,notes,"
-                "custom_fields,custom_fields.name,"
-                "custom_fields.enum_value,custom_fields.enum_value.name"
+                "custom_fields.enum_value.name"
             ),
         }
 
-        for task in self.tasks_api.get_tasks_for_section(seccion_gid, opts):
+        for task in self._listar(self.tasks_api.get_tasks_for_section, seccion_gid, opts):
             if task.get("completed"):
                 continue
 
             nombre = task.get("name") or "(sin título)"
             notas = task.get("notes") or ""
 
-            # Proyecto desde custom field "Proyecto"
-            proyecto = "Sin proyecto"
-            for cf in task.get("custom_fields", []) or []:
-                if cf.get("name") == "Proyecto":
-                    enum_val = cf.get("enum_value")
-                    raw = (enum_val or {}).get("name")
-                    if raw:
-                        if " " in raw and not raw[0].isalnum():
-                            proyecto = raw.split(" ", 1)[1]
-                        else:
-                            proyecto = raw
-                    break
-
-            # Fallback: intentar parsear desde las notas
-            if proyecto == "Sin proyecto":
-                for line in notas.splitlines():
-                    if line.startswith("Proyecto:"):
-                        proyecto = line.split("Proyecto:", 1)[1].strip()
-                        break
+            proyecto = self._proyecto_desde_custom_fields(task)
+            proyecto_notas, emoji_prioridad = _parse_notes_fields(notas)
+
+            # Fallback: proyecto parseado desde las notas
+            if proyecto == "Sin proyecto" and proyecto_notas:
+                proyecto = proyecto_notas
 
             # Emoji de prioridad desde notas (línea "Prioridad: {emoji} ...")
-            emoji_prioridad = "•"
-            for line in notas.splitlines():
-                if line.startswith("Prioridad:"):
-                    rest = line.split("Prioridad:", 1)[1].strip()
-                    if rest:
-                        emoji_prioridad = rest.split()[0]
-                    break
+            emoji_prioridad = emoji_prioridad or "•"
 
             tareas.append(
-                {
-                    "gid": task.get("gid"),
-                    "emoji_prioridad": emoji_prioridad,
-                    "proyecto": proyecto,
-                    "name": nombre,
-                    "seccion": nombre_seccion_corto,
-                }
+                TareaResumen(
+                    gid=task.get("gid"),
+                    emoji_prioridad=emoji_prioridad,
+                    proyecto=proyecto,
+                    name=nombre,
+                    seccion=nombre_seccion_corto,
+                )
             )
 
-        return tareas
+        self._tasks_cache[seccion_gid] = (now, tareas)
+        return list(tareas)
+
+    def _invalidar_cache_tareas(self, seccion_gid: str | None = None):
+        """Invalida el cache de listados de una sección, o de todas si es None."""
+        if seccion_gid is None:
+            self._tasks_cache.clear()
+        else:
+            self._tasks_cache.pop(seccion_gid, None)
 
     def completar_tarea(self, task_gid: str):
         """Marca una tarea como completada y la mueve a la sección 'Hecho'."""
         # Marcar como completada
-        self.tasks_api.update_task(
+        self._call(
+            self.tasks_api.update_task,
             {"data": {"completed": True}},
             task_gid,
             {},
@@ -476,11 +777,15 @@ class AsanaClient:
         # Mover a sección "Hecho" si existe
         seccion_hecho_gid = self._resolver_seccion_gid_por_nombre_corto("Hecho")
         if seccion_hecho_gid:
-            self.sections_api.add_task_for_section(
+            self._call(
+                self.sections_api.add_task_for_section,
                 seccion_hecho_gid,
                 {"body": {"data": {"task": task_gid}}},
             )
-            logger.info(f"✅ Tarea {task_gid} movida a sección 'Hecho'")
+            logger.info("✅ Tarea %s movida a sección 'Hecho'", task_gid)
+
+        # No sabemos de qué sección salió: se invalida todo
+        self._invalidar_cache_tareas()
 
     # ──────────────────────────────────────────────
     # Deadlines próximos
@@ -496,10 +801,8 @@ class AsanaClient:
                 "manana": [{"name": str, "proyecto": str}, ...],
             }
         """
-        from zoneinfo import ZoneInfo
-
         if hoy is None:
-            hoy = datetime.now(ZoneInfo("America/Argentina/Buenos_Aires")).date()
+            hoy = datetime.now(TZ_BA).date()
 
         manana = hoy + timedelta(days=1)
 
@@ -507,10 +810,10 @@ class AsanaClient:
         manana_list: list[dict] = []
 
         opts = {
+            "limit": _PAGE_LIMIT,
             "opt_fields": (
                 "name,completed,due_on,notes,"
-                "custom_fields,custom_fields.name,"
-                "custom_fields.enum_value,custom_fields.enum_value.name"
+                "custom_fields.enum_value.name"
             ),
         }
 
@@ -519,7 +822,7 @@ class AsanaClient:
             if not seccion_gid:
                 continue
 
-            for task in self.tasks_api.get_tasks_for_section(seccion_gid, opts):
+            for task in self._listar(self.tasks_api.get_tasks_for_section, seccion_gid, opts):
                 if task.get("completed"):
                     continue
 
@@ -530,7 +833,7 @@ class AsanaClient:
                 try:
                     due_date = date.fromisoformat(due_on_raw)
                 except Exception:
-                    logger.warning(f"⚠️ No se pudo parsear due_on: {due_on_raw}")
+                    logger.warning("⚠️ No se pudo parsear due_on: %s", due_on_raw)
                     continue
 
                 nombre = task.get("name") or "(sin título)"
@@ -551,29 +854,41 @@ class AsanaClient:
     # Resumen semanal
     # ──────────────────────────────────────────────
 
-    def _extraer_proyecto_desde_task(self, task: dict) -> str:
-        """Obtiene el nombre de proyecto normalizado desde custom fields / notas."""
+    def _fetch_section_tasks(self, nombre_seccion_corto: str, opts: dict) -> list[dict]:
+        """Trae todas las tareas de una sección (paginación incluida) como lista."""
+        seccion_gid = self._resolver_seccion_gid_por_nombre_corto(nombre_seccion_corto)
+        if not seccion_gid:
+            return []
+        return self._listar(self.tasks_api.get_tasks_for_section, seccion_gid, opts)
+
+    def _proyecto_desde_custom_fields(self, task: dict) -> str:
+        """Obtiene el nombre de proyecto normalizado desde el custom field "Proyecto"."""
         proyecto = "Sin proyecto"
-        notas = task.get("notes") or ""
 
-        # Desde custom field "Proyecto"
-        for cf in task.get("custom_fields", []) or []:
-            if cf.get("name") == "Proyecto":
-                enum_val = cf.get("enum_value")
-                raw = (enum_val or {}).get("name")
-                if raw:
-                    if " " in raw and not raw[0].isalnum():
-                        proyecto = raw.split(" ", 1)[1]
-                    else:
-                        proyecto = raw
-                break
+        # Sin campo "Proyecto" configurado no hay nada que buscar
+        campo_gid = self._campo_proyecto_gid
+        if not campo_gid:
+            return proyecto
+
+        cf = next(
+            (cf for cf in task.get("custom_fields") or () if cf.get("gid") == campo_gid),
+            None,
+        )
+        if cf:
+            raw = (cf.get("enum_value") or {}).get("name")
+            if raw:
+                proyecto = _normalizar_nombre_proyecto(raw)
+        return proyecto
+
+    def _extraer_proyecto_desde_task(self, task: dict) -> str:
+        """Obtiene el nombre de proyecto normalizado desde custom fields / notas."""
+        proyecto = self._proyecto_desde_custom_fields(task)
 
         # Fallback: intentar parsear desde las notas
         if proyecto == "Sin proyecto":
-            for line in notas.splitlines():
-                if line.startswith("Proyecto:"):
-                    proyecto = line.split("Proyecto:", 1)[1].strip()
-                    break
+            proyecto_notas, _ = _parse_notes_fields(task.get("notes") or "")
+            if proyecto_notas:
+                proyecto = proyecto_notas
 
         return proyecto
 
@@ -589,69 +904,79 @@ class AsanaClient:
             hoy = datetime.now(timezone.utc).date()
 
         desde = hoy - timedelta(days=6)  # ventana de 7 días: hoy y 6 días hacia atrás
+        desde_iso = desde.isoformat()
+        hoy_iso = hoy.isoformat()
 
         completadas: list[dict] = []
         vencidas: list[dict] = []
-        por_proyecto: dict[str, int] = {}
+        por_proyecto: Counter[str] = Counter()
 
-        # ── Completadas en "Hecho" ─────────────────────────────────────────
-        seccion_hecho_gid = self._resolver_seccion_gid_por_nombre_corto("Hecho")
-        if seccion_hecho_gid:
-            opts_hecho = {
-                "opt_fields": (
-                    "name,completed,completed_at,notes,"
-                    "custom_fields,custom_fields.name,"
-                    "custom_fields.enum_value,custom_fields.enum_value.name"
-                ),
-            }
-            for task in self.tasks_api.get_tasks_for_section(seccion_hecho_gid, opts_hecho):
-                if not task.get("completed"):
-                    continue
+        # Sin "notes" en "Hecho": el proyecto sale del custom field, y las tareas
+        # sin él quedan como "Sin proyecto". Reduce bastante el payload por tarea.
+        opts_hecho = {
+            "limit": _PAGE_LIMIT,
+            "opt_fields": (
+                "name,completed,completed_at,"
+                "custom_fields.enum_value.name"
+            ),
+        }
+        opts_pendientes = {
+            "limit": _PAGE_LIMIT,
+            "opt_fields": (
+                "name,completed,due_on,notes,"
+                "custom_fields.enum_value.name"
+            ),
+        }
 
-                completed_at_raw = task.get("completed_at")
-                if not completed_at_raw:
-                    continue
+        # Las cuatro secciones son independientes: se piden en paralelo
+        pedidos = [
+            ("Hecho", opts_hecho),
+            ("Hoy", opts_pendientes),
+            ("Semana", opts_pendientes),
+            ("Backlog", opts_pendientes),
+        ]
+        with ThreadPoolExecutor(max_workers=len(pedidos)) as executor:
+            tareas_hecho, *tareas_pendientes = executor.map(
+                lambda pedido: self._fetch_section_tasks(*pedido), pedidos
+            )
 
-                try:
-                    # Asana devuelve ISO 8601, normalmente con 'Z'
-                    completed_dt = datetime.fromisoformat(
-                        completed_at_raw.replace("Z", "+00:00")
-                    )
-                    completed_date = completed_dt.date()
-                except Exception:
-                    logger.warning(f"⚠️ No se pudo parsear completed_at: {completed_at_raw}")
-                    continue
+        # ── Completadas en "Hecho" ─────────────────────────────────────────
+        for task in tareas_hecho:
+            if not task.get("completed"):
+                continue
 
-                if not (desde <= completed_date <= hoy):
-                    continue
+            completed_at_raw = task.get("completed_at")
+            if not completed_at_raw:
+                continue
 
-                proyecto = self._extraer_proyecto_desde_task(task)
-                nombre = task.get("name") or "(sin título)"
+            # Asana devuelve ISO 8601 en UTC ("YYYY-MM-DDTHH:MM:SS.sssZ"):
+            # alcanza con la fecha. Las fechas ISO comparan bien como strings,
+            # así que se filtra la ventana antes de parsear o extraer nada.
+            completed_iso = completed_at_raw[:10]
+            if not (desde_iso <= completed_iso <= hoy_iso):
+                continue
 
-                completadas.append(
-                    {
-                        "name": nombre,
-                        "proyecto": proyecto,
-                    }
-                )
+            try:
+                date.fromisoformat(completed_iso)
+            except ValueError:
+                logger.warning("⚠️ No se pudo parsear completed_at: %s", completed_at_raw)
+                continue
 
-                por_proyecto[proyecto] = por_proyecto.get(proyecto, 0) + 1
+            proyecto = self._proyecto_desde_custom_fields(task)
+            nombre = task.get("name") or "(sin título)"
 
-        # ── Vencidas en Hoy / Semana / Backlog ─────────────────────────────
-        opts_pendientes = {
-            "opt_fields": (
-                "name,completed,due_on,notes,"
-                "custom_fields,custom_fields.name,"
-                "custom_fields.enum_value,custom_fields.enum_value.name"
-            ),
-        }
+            completadas.append(
+                {
+                    "name": nombre,
+                    "proyecto": proyecto,
+                }
+            )
 
-        for nombre_seccion in ("Hoy", "Semana", "Backlog"):
-            seccion_gid = self._resolver_seccion_gid_por_nombre_corto(nombre_seccion)
-            if not seccion_gid:
-                continue
+            por_proyecto[proyecto] += 1
 
-            for task in self.tasks_api.get_tasks_for_section(seccion_gid, opts_pendientes):
+        # ── Vencidas en Hoy / Semana / Backlog ─────────────────────────────
+        for tareas_seccion in tareas_pendientes:
+            for task in tareas_seccion:
                 if task.get("completed"):
                     continue
 
@@ -662,7 +987,7 @@ class AsanaClient:
                 try:
                     due_date = date.fromisoformat(due_on_raw)
                 except Exception:
-                    logger.warning(f"⚠️ No se pudo parsear due_on: {due_on_raw}")
+                    logger.warning("⚠️ No se pudo parsear due_on: %s", due_on_raw)
                     continue
 
                 if due_date >= hoy:
@@ -688,7 +1013,7 @@ class AsanaClient:
             "hasta": hoy,
             "completadas": completadas,
             "vencidas": vencidas,
-            "por_proyecto": por_proyecto,
+            "por_proyecto": dict(por_proyecto),
         }
 
     # ──────────────────────────────────────────────
@@ -702,6 +1027,8 @@ class AsanaClient:
         """
         hoy = datetime.now(timezone.utc).date()
         desde = hoy - timedelta(days=dias)
+        desde_iso = desde.isoformat()
+        hoy_iso = hoy.isoformat()
 
         datos = {
             "periodo_analisis_dias": dias,
@@ -718,15 +1045,14 @@ class AsanaClient:
         seccion_hecho_gid = self._resolver_seccion_gid_por_nombre_corto("Hecho")
         if seccion_hecho_gid:
             opts_hecho = {
+                "limit": _PAGE_LIMIT,
                 "opt_fields": (
                     "name,completed,completed_at,notes,"
-                    "custom_fields,custom_fields.name,"
-                    "custom_fields.enum_value,custom_fields.enum_value.name"
+                    "custom_fields.enum_value.name"
                 )
             }
-            # Limitamos la paginación internamente si hay demasiadas, pero Asana por defecto trae páginas de a 50
             try:
-                for task in self.tasks_api.get_tasks_for_section(seccion_hecho_gid, opts_hecho):
+                for task in self._listar(self.tasks_api.get_tasks_for_section, seccion_hecho_gid, opts_hecho):
                     if not task.get("completed"):
                         continue
                         
@@ -734,28 +1060,29 @@ class AsanaClient:
                     if not completed_at_raw:
                         continue
                         
+                    completed_iso = completed_at_raw[:10]
+                    if not (desde_iso <= completed_iso <= hoy_iso):
+                        continue
+
                     try:
-                        completed_date = datetime.fromisoformat(
-                            completed_at_raw.replace("Z", "+00:00")
-                        ).date()
-                    except Exception:
+                        date.fromisoformat(completed_iso)
+                    except ValueError:
                         continue
-                        
-                    if desde <= completed_date <= hoy:
-                        datos["tareas_completadas"].append({
-                            "nombre": task.get("name") or "(sin título)",
-                            "proyecto": self._extraer_proyecto_desde_task(task),
-                            "fecha_completada": str(completed_date)
-                        })
+
+                    datos["tareas_completadas"].append({
+                        "nombre": task.get("name") or "(sin título)",
+                        "proyecto": self._extraer_proyecto_desde_task(task),
+                        "fecha_completada": completed_iso
+                    })
             except Exception as e:
-                logger.error(f"Error iterando completadas para análisis: {e}")
+                logger.error("Error iterando completadas para análisis: %s", e)
 
         # 2. Traer pendientes (Hoy, Semana, Backlog)
         opts_pendientes = {
+            "limit": _PAGE_LIMIT,
             "opt_fields": (
                 "name,completed,due_on,notes,"
-                "custom_fields,custom_fields.name,"
-                "custom_fields.enum_value,custom_fields.enum_value.name"
+                "custom_fields.enum_value.name"
             )
         }
         
@@ -765,7 +1092,7 @@ class AsanaClient:
                 continue
                 
             try:
-                for task in self.tasks_api.get_tasks_for_section(sec_gid, opts_pendientes):
+                for task in self._listar(self.tasks_api.get_tasks_for_section, sec_gid, opts_pendientes):
                     if task.get("completed"):
                         continue
                         
@@ -775,8 +1102,7 @@ class AsanaClient:
                         "due_on": task.get("due_on")  # Puede ser None
                     })
             except Exception as e:
-                logger.error(f"Error iterando pendientes para análisis en {seccion}: {e}")
+                logger.error("Error iterando pendientes para análisis en %s: %s", seccion, e)
 
         # Retornamos todo como un JSON string indentado para pasárselo a Claude
-        import json
-        return json.dumps(datos, ensure_ascii=False, indent=2)
+        return json_dumps(datos).decode("utf-8")
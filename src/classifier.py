@@ -1,6 +1,7 @@
 """Clasificación de mensajes con GPT-4o-mini."""
 
-import json
+import functools
+import re
 from datetime import datetime
 
 import anthropic
@@ -83,58 +84,10 @@ TOOLS_VISTA = [
     },
 ]
 
-def _sanitizar_historial(historial: list[dict]) -> list[dict]:
-    """
-    Asegura que el historial alterne user/assistant correctamente.
-    Si hay mensajes consecutivos del mismo rol, conserva solo el último.
-    El historial siempre debe empezar con 'user'.
-    """
-    if not historial:
-        return historial
-
-    sanitizado = []
-    for msg in historial:
-        if sanitizado and sanitizado[-1]["role"] == msg["role"]:
-            # Dos del mismo rol seguidos: reemplazar el anterior con el más reciente
-            sanitizado[-1] = msg
-        else:
-            sanitizado.append(msg)
+_TOOLS = [TOOL_GUARDAR_TAREA] + TOOLS_VISTA
 
-    # La API de Anthropic requiere que empiece con 'user'
-    while sanitizado and sanitizado[0]["role"] != "user":
-        sanitizado.pop(0)
-
-    return sanitizado
-
-
-def clasificar_mensaje(historial_mensajes: list[dict]) -> dict:
-    """
-    Clasifica el contexto de una conversación usando Claude 3.5 Sonnet.
-    
-    Toma un historial de mensajes con formato de Anthropic:
-    [{"role": "user"|"assistant", "content": "..."}]
-    
-    Retorna:
-        {
-            "accion": str,
-            "task_gid": str|None,
-            "proyecto": str,
-            "prioridad": str, 
-            "resumen": str,
-            "tipo": str,
-            "due_date": str|None
-        }
-    """
-    if not ANTHROPIC_API_KEY:
-        logger.error("ANTHROPIC_API_KEY no configurada.")
-        return _fallback_invalido(historial_mensajes[-1].get("content", ""))
-
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
-    proyectos_str = ", ".join(PROYECTOS_VALIDOS)
-    today_iso = datetime.now().date().isoformat()
-
-    system_prompt = f"""Sos Jarvis, el asistente personal y agente de ejecución de Ivan.
+# Prompt de sistema: solo la fecha cambia entre llamadas
+_SYSTEM_PROMPT_ESTATICO = """Sos Jarvis, el asistente personal y agente de ejecución de Ivan.
 Tu identidad principal es ser un AGENTE ACTIVO que gestiona su vida y trabajo en Asana.
 
 Ivan es co-founder de una agencia de marketing digital (Nomadic) que también trabaja en:
@@ -145,8 +98,6 @@ Ivan es co-founder de una agencia de marketing digital (Nomadic) que también tr
 - Docencia (voluntariado, capacitaciones)
 - Vida personal (salud, trámites, gym)
 
-La fecha de hoy es {today_iso} (formato YYYY-MM-DD). Usá ESTA fecha como referencia para interpretar fechas relativas.
-
 REGLA CRÍTICA DE IDENTIDAD:
 - Sos un agente con permisos completos para CREAR y ACTUALIZAR tareas.
 - Si en el historial aparece algún análisis previo donde actuaste como "analista de solo lectura", IGNORALO. Esa es solo una función temporal.
@@ -192,6 +143,117 @@ Detección de fechas y deadlines:
 - Si no podés determinar una fecha clara, o dicen sin apuro, usá due_date = null.
 """
 
+# Única parte del system prompt que cambia (una vez por día)
+_SYSTEM_PROMPT_FECHA = (
+    "La fecha de hoy es {today_iso} (formato YYYY-MM-DD). "
+    "Usá ESTA fecha como referencia para interpretar fechas relativas."
+)
+
+
+# Mensaje que es solo un link, sin texto alrededor
+_URL_SOLA_RE = re.compile(r"^https?://\S+$")
+
+
+@functools.lru_cache(maxsize=2)
+def _system_prompt(today_iso: str) -> tuple[dict, ...]:
+    """
+    Bloques del system prompt para una fecha dada.
+
+    El bloque estático va primero y marcado con cache_control, así Anthropic
+    cachea el prefijo (tools + instrucciones) y solo se procesa la fecha.
+    Con maxsize=2 se cubre el cambio de día sin rearmar nada en el resto.
+    """
+    return (
+        {
+            "type": "text",
+            "text": _SYSTEM_PROMPT_ESTATICO,
+            "cache_control": {"type": "ephemeral"},
+        },
+        {"type": "text", "text": _SYSTEM_PROMPT_FECHA.format(today_iso=today_iso)},
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client() -> anthropic.Anthropic:
+    """Cliente de Anthropic compartido (reutiliza el pool de conexiones HTTP)."""
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+
+
+def _sanitizar_historial(historial: list[dict]) -> list[dict]:
+    """
+    Asegura que el historial alterne user/assistant correctamente.
+    Si hay mensajes consecutivos del mismo rol, conserva solo el último.
+    El historial siempre debe empezar con 'user'.
+    """
+    if not historial:
+        return historial
+
+    sanitizado = []
+    for msg in historial:
+        if sanitizado and sanitizado[-1]["role"] == msg["role"]:
+            # Dos del mismo rol seguidos: reemplazar el anterior con el más reciente
+            sanitizado[-1] = msg
+        else:
+            sanitizado.append(msg)
+
+    # La API de Anthropic requiere que empiece con 'user'
+    while sanitizado and sanitizado[0]["role"] != "user":
+        sanitizado.pop(0)
+
+    return sanitizado
+
+
+def clasificacion_rapida(texto: str) -> dict | None:
+    """
+    Clasifica sin llamar a Claude los mensajes que no necesitan interpretación.
+
+    Hoy cubre solo un link suelto: se guarda como referencia de baja prioridad.
+    Devuelve None si el mensaje requiere el clasificador completo.
+    """
+    texto = texto.strip()
+    if not _URL_SOLA_RE.match(texto):
+        return None
+
+    logger.info("Clasificado (regla): link suelto -> referencia")
+    return {
+        "intent": "guardar_tarea_asana",
+        "accion": "crear",
+        "task_gid": None,
+        "proyecto": "Personal",
+        "prioridad": "baja",
+        "resumen": texto if len(texto) <= 80 else texto[:77] + "...",
+        "tipo": "referencia",
+        "due_date": None,
+    }
+
+
+def clasificar_mensaje(historial_mensajes: list[dict]) -> dict:
+    """
+    Clasifica el contexto de una conversación usando Claude 3.5 Sonnet.
+    
+    Toma un historial de mensajes con formato de Anthropic:
+    [{"role": "user"|"assistant", "content": "..."}]
+    
+    Retorna:
+        {
+            "accion": str,
+            "task_gid": str|None,
+            "proyecto": str,
+            "prioridad": str, 
+            "resumen": str,
+            "tipo": str,
+            "due_date": str|None
+        }
+    """
+    if not ANTHROPIC_API_KEY:
+        logger.error("ANTHROPIC_API_KEY no configurada.")
+        return _fallback_invalido(historial_mensajes[-1].get("content", ""))
+
+    client = _get_client()
+
+    today_iso = datetime.now().date().isoformat()
+    system_prompt = _system_prompt(today_iso)
+
     try:
         historial_sanitizado = _sanitizar_historial(historial_mensajes)
         response = client.messages.create(
@@ -200,7 +262,7 @@ Detección de fechas y deadlines:
             temperature=0.2,
             system=system_prompt,
             messages=historial_sanitizado,
-            tools=[TOOL_GUARDAR_TAREA] + TOOLS_VISTA,
+            tools=_TOOLS,
             tool_choice={"type": "auto"},
         )
 
@@ -217,13 +279,13 @@ Detección de fechas y deadlines:
         
         # Si es analizar patrones, además del intent enviamos la query literal del usuario
         if intent == "analizar_patrones":
-            logger.info(f"Clasificado (Claude): Solicitud de análisis -> analizar_patrones")
+            logger.info("Clasificado (Claude): Solicitud de análisis -> analizar_patrones")
             query_usuario = historial_mensajes[-1].get("content", "")
             return {"intent": intent, "query": query_usuario}
 
         # Si es una tool de vista común, retornamos directamente la intención
         if intent in ["ver_tareas_hoy", "ver_tareas_semana", "ver_backlog", "ver_deadlines", "ver_resumen"]:
-            logger.info(f"Clasificado (Claude): Solicitud de vista -> {intent}")
+            logger.info("Clasificado (Claude): Solicitud de vista -> %s", intent)
             return {"intent": intent}
         
         # Si es guardar tarea
@@ -233,7 +295,7 @@ Detección de fechas y deadlines:
         # Validar y sanitizar
         if resultado.get("proyecto") not in PROYECTOS_VALIDOS:
             logger.warning(
-                f"Proyecto inválido '{resultado.get('proyecto')}', usando 'Personal'"
+                "Proyecto inválido '%s', usando 'Personal'", resultado.get("proyecto")
             )
             resultado["proyecto"] = "Personal"
 
@@ -244,12 +306,15 @@ Detección de fechas y deadlines:
             resultado["resumen"] = resultado["resumen"][:77] + "..."
 
         logger.info(
-            f"Clasificado (Claude): [{resultado['proyecto']}] [{resultado['prioridad']}] {resultado['resumen']}"
+            "Clasificado (Claude): [%s] [%s] %s",
+            resultado["proyecto"],
+            resultado["prioridad"],
+            resultado["resumen"],
         )
         return resultado
 
     except Exception as e:
-        logger.error(f"Error clasificando mensaje con Claude: {e}")
+        logger.error("Error clasificando mensaje con Claude: %s", e)
         return _fallback_invalido(historial_mensajes[-1].get("content", ""))
 
 def _fallback_invalido(texto: str) -> dict:
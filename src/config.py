@@ -3,6 +3,7 @@
 import os
 import logging
 from pathlib import Path
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 # Cargar .env
@@ -34,11 +35,20 @@ ASANA_PROJECT_GID = os.getenv("ASANA_PROJECT_GID", "1213411524368931")
 DATA_DIR = Path(__file__).parent.parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
 PROCESADOS_FILE = DATA_DIR / "procesados.json"
+# Log append-only de mensajes procesados (un ID por línea)
+PROCESADOS_LOG_FILE = DATA_DIR / "procesados.log"
+# Cada cuántos IDs nuevos se compacta el log de procesados
+PROCESADOS_COMPACTAR_CADA = 500
 ASANA_IDS_FILE = DATA_DIR / "asana_ids.json"
 # Chat de Telegram donde enviar resúmenes automáticos
 CHAT_ID_FILE = DATA_DIR / "chat_id.json"
 # Historial de conversación
 HISTORY_FILE = DATA_DIR / "history.json"
+# Cache de transcripciones de Whisper (hash del audio → texto)
+TRANSCRIPCIONES_DB = DATA_DIR / "transcripciones.sqlite3"
+
+# Zona horaria del usuario: define "hoy" y los horarios de los envíos programados
+TZ_BA = ZoneInfo("America/Argentina/Buenos_Aires")
 
 # Mapeo prioridad → sección
 PRIORIDAD_SECCION_MAP = {
@@ -47,6 +57,13 @@ PRIORIDAD_SECCION_MAP = {
     "baja": "Backlog",
 }
 
+# Emoji de prioridad que se escribe en las notas de cada tarea
+EMOJI_PRIORIDAD = {
+    "alta": "🔴",
+    "media": "🟡",
+    "baja": "🟢",
+}
+
 # Valores válidos del campo "Proyecto"
 PROYECTOS_VALIDOS = [
     "Speaker",
@@ -60,16 +77,19 @@ PROYECTOS_VALIDOS = [
 ]
 
 
+# Variables de entorno obligatorias (nombre, valor)
+_REQUIRED = (
+    ("TELEGRAM_BOT_TOKEN", TELEGRAM_BOT_TOKEN),
+    ("OPENAI_API_KEY", OPENAI_API_KEY),
+    ("ANTHROPIC_API_KEY", ANTHROPIC_API_KEY),
+    ("ASANA_ACCESS_TOKEN", ASANA_ACCESS_TOKEN),
+)
+
+
 def validate_config():
     """Verifica que todas las variables requeridas estén presentes."""
-    required = {
-        "TELEGRAM_BOT_TOKEN": TELEGRAM_BOT_TOKEN,
-        "OPENAI_API_KEY": OPENAI_API_KEY,
-        "ANTHROPIC_API_KEY": ANTHROPIC_API_KEY,
-        "ASANA_ACCESS_TOKEN": ASANA_ACCESS_TOKEN,
-    }
-    missing = [k for k, v in required.items() if not v]
-    if missing:
+    if not all(v for _, v in _REQUIRED):
+        missing = [k for k, v in _REQUIRED if not v]
         raise ValueError(f"Faltan variables de entorno: {', '.join(missing)}")
     logger.info("✅ Configuración validada correctamente")
 CHATS_AUTORIZADOS = []
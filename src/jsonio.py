@@ -0,0 +1,35 @@
+"""Lectura y escritura de JSON compartida por los módulos de src/."""
+
+import json
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa json estándar como fallback
+    orjson = None
+
+
+def json_loads(data: bytes):
+    """Parsea JSON desde bytes (orjson si está disponible)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(data) -> bytes:
+    """Serializa a JSON indentado en UTF-8 (orjson si está disponible)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def guardar_json_atomico(path: Path, data):
+    """
+    Escribe un JSON chico de una sola vez, sin pasar por BufferedWriter.
+
+    Escribe a un temporal y lo renombra, así nunca queda un archivo a medias.
+    """
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb", buffering=0) as f:
+        f.write(json_dumps(data))
+    tmp.replace(path)
@@ -1,30 +1,51 @@
 """Bot de Telegram — Punto de entrada de captura."""
 
-import json
+import asyncio
+import io
 import threading
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from datetime import date, time
-from zoneinfo import ZoneInfo
 import os
 import re
+import unicodedata
+import warnings
 from datetime import datetime
+from time import monotonic
 from dotenv import load_dotenv
+from rapidfuzz import fuzz, process, utils
 
-from telegram import Update
+try:
+    import uvloop
+except ImportError:  # uvloop es opcional (no existe en Windows): loop estándar de asyncio
+    uvloop = None
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.warnings import PTBUserWarning
 from telegram.ext import (
     Application,
     ApplicationBuilder,
+    CallbackQueryHandler,
     MessageHandler,
     CommandHandler,
     ConversationHandler,
     filters,
     ContextTypes,
 )
-from .config import TELEGRAM_BOT_TOKEN, CHAT_ID_FILE, HISTORY_FILE, logger, DATA_DIR, CHATS_AUTORIZADOS
-from .classifier import clasificar_mensaje
+from .config import (
+    TELEGRAM_BOT_TOKEN,
+    CHAT_ID_FILE,
+    HISTORY_FILE,
+    logger,
+    DATA_DIR,
+    CHATS_AUTORIZADOS,
+    PRIORIDAD_SECCION_MAP,
+    TZ_BA,
+)
+from .classifier import clasificacion_rapida, clasificar_mensaje
 from .transcriber import transcribir_audio
 from .asana_client import AsanaClient
 from .analysis import generar_analisis_patrones
+from .jsonio import guardar_json_atomico, json_loads
 
 # Cliente Asana (se inicializa una vez)
 asana_client: AsanaClient | None = None
@@ -33,6 +54,46 @@ asana_client: AsanaClient | None = None
 DONE_WAITING_SELECTION = 1
 DONE_WAITING_CONFIRMATION = 2
 
+# Respuestas aceptadas en la confirmación de /done
+_RESPUESTAS_SI = frozenset({"sí", "si", "s", "yes", "y"})
+_RESPUESTAS_NO = frozenset({"no", "n"})
+
+# Texto libre (no comandos): se comparte una sola instancia entre handlers
+_TEXT_NO_CMD = filters.TEXT & ~filters.COMMAND
+
+# Puntaje mínimo (0-100) para que /done <texto> tome una tarea como match
+_DONE_FUZZY_CUTOFF = 60
+
+# Máximo de tareas que se ofrecen como botones en /done (más que eso: listado numerado)
+_DONE_MAX_BOTONES = 50
+# Largo máximo del nombre de la tarea en el texto de cada botón de /done
+_DONE_LARGO_BOTON = 40
+
+# Emojis del mensaje de confirmación (prioridad y tipo de tarea)
+_EMOJI_PRIORIDAD_CONFIRMACION = {"alta": "🔥", "media": "📌", "baja": "💤"}
+_EMOJI_TIPO = {
+    "tarea": "✅",
+    "idea": "💡",
+    "seguimiento": "🔄",
+    "referencia": "📎",
+    "nota": "📝",
+}
+
+# Horarios de cada job programado (hora Argentina)
+_HORA_DEADLINES = time(hour=9, minute=0, tzinfo=TZ_BA)
+_HORA_RESUMEN = time(hour=18, minute=0, tzinfo=TZ_BA)
+
+# Días de la semana en español, indexados por date.weekday()
+_DIAS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+# Segundos que se reutiliza el texto del resumen semanal antes de volver a Asana
+_RESUMEN_TTL = 60
+# (momento monotónico, texto) del último resumen semanal generado
+_resumen_cache: tuple[float, str] | None = None
+
+# chat_id ya guardado en data/chat_id.json (cache para no leer el archivo por update)
+_chat_id_persistido: int | None = None
+
 # Historial de conversación en memoria
 historial_conversaciones: dict[str, list[dict]] = {}
 
@@ -62,28 +123,36 @@ def _split_long_message(text: str, max_length: int = 4000) -> list[str]:
         text = text[split_point:].lstrip()
         
     return chunks
+
+
+async def _responder_en_partes(update: Update, texto: str):
+    """Responde un texto que puede pasar el límite de Telegram, en varios mensajes."""
+    for parte in _split_long_message(texto):
+        await update.message.reply_text(parte)
+
+
 MAX_HISTORIAL = 20
 
 def _cargar_historial():
     """Carga el historial de conversaciones desde disco."""
     global historial_conversaciones
-    if HISTORY_FILE.exists():
-        try:
-            data = json.loads(HISTORY_FILE.read_text(encoding="utf-8"))
-            historial_conversaciones = data
-            logger.info(f"💾 Historial cargado desde {HISTORY_FILE}")
-        except Exception as e:
-            logger.error(f"❌ No se pudo cargar historial: {e}")
+    try:
+        data = json_loads(HISTORY_FILE.read_bytes())
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.error("❌ No se pudo cargar historial: %s", e)
+        return
+
+    historial_conversaciones = data
+    logger.info("💾 Historial cargado desde %s", HISTORY_FILE)
 
 def _guardar_historial():
     """Guarda el historial de conversaciones a disco."""
     try:
-        HISTORY_FILE.write_text(
-            json.dumps(historial_conversaciones, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        guardar_json_atomico(HISTORY_FILE, historial_conversaciones)
     except Exception as e:
-        logger.error(f"❌ No se pudo guardar historial: {e}")
+        logger.error("❌ No se pudo guardar historial: %s", e)
 
 def _agregar_mensaje_historial(chat_id: str, role: str, content: str):
     """Agrega un mensaje al historial de un chat."""
@@ -101,53 +170,75 @@ def _agregar_mensaje_historial(chat_id: str, role: str, content: str):
 
 
 
+def _leer_chat_id() -> int | None:
+    """Devuelve el chat_id persistido, leyendo data/chat_id.json solo la primera vez."""
+    global _chat_id_persistido
+    if _chat_id_persistido is not None:
+        return _chat_id_persistido
+
+    try:
+        data = json_loads(CHAT_ID_FILE.read_bytes())
+    except FileNotFoundError:
+        return None
+
+    _chat_id_persistido = data.get("chat_id")
+    if not _chat_id_persistido:
+        logger.warning("⚠️ chat_id.json no contiene 'chat_id'")
+    return _chat_id_persistido
+
+
 def _ensure_chat_id_persisted(update: Update):
     """Guarda el chat_id en data/chat_id.json si aún no existe."""
+    global _chat_id_persistido
     if not update.effective_chat:
         return
 
     chat_id = update.effective_chat.id
 
+    # Caso normal: el mismo chat de siempre, sin tocar disco
+    if _chat_id_persistido == chat_id:
+        return
+
     try:
-        if CHAT_ID_FILE.exists():
-            # Si ya existe y es el mismo, no hacemos nada
-            data = json.loads(CHAT_ID_FILE.read_text(encoding="utf-8"))
-            if data.get("chat_id") == chat_id:
-                return
-
-        CHAT_ID_FILE.write_text(
-            json.dumps({"chat_id": chat_id}, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-        logger.info(f"💾 chat_id guardado/actualizado en {CHAT_ID_FILE}")
+        # Si ya existe y es el mismo, no hacemos nada
+        if _leer_chat_id() == chat_id:
+            return
+
+        guardar_json_atomico(CHAT_ID_FILE, {"chat_id": chat_id})
+        _chat_id_persistido = chat_id
+        logger.info("💾 chat_id guardado/actualizado en %s", CHAT_ID_FILE)
     except Exception as e:
-        logger.error(f"❌ No se pudo guardar chat_id: {e}")
+        logger.error("❌ No se pudo guardar chat_id: %s", e)
 
 
 def _formatear_rango_fechas(desde: date, hasta: date) -> str:
     """Devuelve un string tipo 'lunes 24/2 → viernes 28/2'."""
-    dias = [
-        "lunes",
-        "martes",
-        "miércoles",
-        "jueves",
-        "viernes",
-        "sábado",
-        "domingo",
-    ]
+    return (
+        f"{_DIAS[desde.weekday()]} {desde.day}/{desde.month} → "
+        f"{_DIAS[hasta.weekday()]} {hasta.day}/{hasta.month}"
+    )
 
-    def fmt(d: date) -> str:
-        return f"{dias[d.weekday()]} {d.day}/{d.month}"
 
-    return f"{fmt(desde)} → {fmt(hasta)}"
+def _invalidar_resumen_cache():
+    """Descarta el resumen semanal cacheado (tras /refresh o al completar una tarea)."""
+    global _resumen_cache
+    _resumen_cache = None
 
 
 def _formatear_resumen_semanal() -> str:
-    """Construye el texto del resumen semanal a partir de Asana."""
-    global asana_client
+    """Construye el texto del resumen semanal a partir de Asana.
+
+    Si /resumen y el job de los viernes coinciden, el segundo reutiliza el texto
+    generado hace menos de _RESUMEN_TTL segundos en lugar de volver a consultar Asana.
+    """
+    global asana_client, _resumen_cache
     if asana_client is None:
         raise RuntimeError("AsanaClient no inicializado")
 
+    cache = _resumen_cache
+    if cache is not None and monotonic() - cache[0] < _RESUMEN_TTL:
+        return cache[1]
+
     resumen = asana_client.obtener_resumen_semanal()
     desde: date = resumen["desde"]
     hasta: date = resumen["hasta"]
@@ -161,30 +252,31 @@ def _formatear_resumen_semanal() -> str:
     # Completadas
     lineas.append(f"\n✅ Completadas ({len(completadas)})")
     if completadas:
-        for t in completadas:
-            lineas.append(f"• {t['proyecto']} — {t['name']}")
+        lineas.extend(f"• {t['proyecto']} — {t['name']}" for t in completadas)
     else:
         lineas.append("• (ninguna)")
 
     # Vencidas / atrasadas
     lineas.append(f"\n⚠️ Vencidas / atrasadas ({len(vencidas)})")
     if vencidas:
-        for t in vencidas:
-            d = t["due_on"]
-            lineas.append(
-                f"• {t['proyecto']} — {t['name']} (venció {d.day}/{d.month})"
-            )
+        lineas.extend(
+            f"• {t['proyecto']} — {t['name']} (venció {t['due_on'].day}/{t['due_on'].month})"
+            for t in vencidas
+        )
     else:
         lineas.append("• (ninguna)")
 
     # Por proyecto
     if por_proyecto:
-        partes = [f"{proj} ({count})" for proj, count in sorted(por_proyecto.items())]
-        lineas.append(f"\n📁 Por proyecto: " + ", ".join(partes))
+        lineas.append("\n📁 Por proyecto: " + ", ".join(
+            f"{proj} ({count})" for proj, count in sorted(por_proyecto.items())
+        ))
     else:
         lineas.append("\n📁 Por proyecto: (sin tareas completadas)")
 
-    return "\n".join(lineas)
+    texto = "\n".join(lineas)
+    _resumen_cache = (monotonic(), texto)
+    return texto
 
 def _formatear_deadlines() -> str:
     """Construye el texto del reporte de deadlines."""
@@ -218,19 +310,9 @@ def _formatear_deadlines() -> str:
 
 def _formatear_confirmacion(clasificacion: dict, accion: str = "crear") -> str:
     """Formatea el mensaje de confirmación para Telegram."""
-    emoji_prioridad = {"alta": "🔥", "media": "📌", "baja": "💤"}.get(
-        clasificacion.get("prioridad"), "📌"
-    )
-    seccion = {"alta": "Hoy", "media": "Semana", "baja": "Backlog"}.get(
-        clasificacion.get("prioridad"), "Semana"
-    )
-    emoji_tipo = {
-        "tarea": "✅",
-        "idea": "💡",
-        "seguimiento": "🔄",
-        "referencia": "📎",
-        "nota": "📝",
-    }.get(clasificacion.get("tipo"), "📝")
+    emoji_prioridad = _EMOJI_PRIORIDAD_CONFIRMACION.get(clasificacion.get("prioridad"), "📌")
+    seccion = PRIORIDAD_SECCION_MAP.get(clasificacion.get("prioridad"), "Semana")
+    emoji_tipo = _EMOJI_TIPO.get(clasificacion.get("tipo"), "📝")
 
     verbo = "Actualizado" if accion == "actualizar" else "Capturado"
 
@@ -249,22 +331,34 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     texto = update.message.text
     message_id = str(update.message.message_id)
 
-    logger.info(f"📨 Texto recibido: {texto[:100]}...")
+    logger.info("📨 Texto recibido: %.100s...", texto)
+
+    # Reintento de Telegram de un mensaje ya cargado: no volver a clasificar
+    if asana_client.ya_procesado(message_id, "telegram"):
+        logger.info("⏭️ Mensaje %s ya procesado, no se reclasifica", message_id)
+        await update.message.reply_text("⏭️ Este mensaje ya fue procesado anteriormente.")
+        return
 
     try:
         # Añadir al historial
         _agregar_mensaje_historial(chat_id, "user", texto)
 
-        # Clasificar con historial
-        clasificacion = clasificar_mensaje(historial_conversaciones[chat_id])
+        # Casos obvios (ej: un link suelto) se clasifican sin llamar a Claude
+        clasificacion = clasificacion_rapida(texto)
+        if clasificacion is None:
+            # Clasificar con historial (llamada HTTP bloqueante: fuera del event loop).
+            # Se pasa una copia para que otro update no mute la lista mientras tanto.
+            clasificacion = await asyncio.to_thread(
+                clasificar_mensaje, list(historial_conversaciones[chat_id])
+            )
 
         intent = clasificacion.get("intent", "guardar_tarea_asana")
 
         if intent == "analizar_patrones":
             processing_msg = await update.message.reply_text("⏳ Extrayendo historial de Asana y analizando patrones...")
             query = clasificacion.get("query", texto)
-            datos_historicos = asana_client.obtener_datos_historicos_analisis(dias=30)
-            respuesta_analisis = generar_analisis_patrones(query, datos_historicos)
+            datos_historicos = await asyncio.to_thread(asana_client.obtener_datos_historicos_analisis, dias=30)
+            respuesta_analisis = await asyncio.to_thread(generar_analisis_patrones, query, datos_historicos)
             
             chunks = _split_long_message(respuesta_analisis)
             await processing_msg.edit_text(chunks[0])
@@ -286,12 +380,12 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré el backlog.")
             return
         elif intent == "ver_deadlines":
-            texto_deadlines = _formatear_deadlines()
+            texto_deadlines = await asyncio.to_thread(_formatear_deadlines)
             await update.message.reply_text(texto_deadlines)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré los deadlines próximos.")
             return
         elif intent == "ver_resumen":
-            texto_resumen = _formatear_resumen_semanal()
+            texto_resumen = await asyncio.to_thread(_formatear_resumen_semanal)
             await update.message.reply_text(texto_resumen)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré el resumen semanal.")
             return
@@ -301,7 +395,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         task_gid = clasificacion.get("task_gid")
 
         if accion == "actualizar" and task_gid:
-            task = asana_client.actualizar_tarea(
+            task = await asyncio.to_thread(
+                asana_client.actualizar_tarea,
                 task_gid=task_gid,
                 clasificacion=clasificacion,
             )
@@ -313,7 +408,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 _agregar_mensaje_historial(chat_id, "assistant", respuesta)
         else:
             # Crear nueva tarea
-            task = asana_client.crear_tarea(
+            task = await asyncio.to_thread(
+                asana_client.crear_tarea,
                 texto=texto,
                 clasificacion=clasificacion,
                 message_id=message_id,
@@ -330,42 +426,83 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(respuesta)
 
     except Exception as e:
-        logger.error(f"Error procesando texto: {e}")
+        logger.error("Error procesando texto: %s", e)
         await update.message.reply_text(f"❌ Error procesando mensaje: {str(e)[:100]}")
 
 
+async def _descargar_audio(telegram_file) -> io.BytesIO:
+    """
+    Descarga un archivo de Telegram a un BytesIO, que se pasa tal cual a Whisper.
+
+    Evita el bytearray + bytes() de download_as_bytearray, que duplicaba el audio.
+    """
+    buffer = io.BytesIO()
+    await telegram_file.download_to_memory(buffer)
+    return buffer
+
+
+async def _responder_error_audio(update: Update, processing_task: asyncio.Task | None, mensaje: str):
+    """
+    Muestra un error de audio en el placeholder "Transcribiendo audio...".
+
+    Siempre espera la task del placeholder (así no queda huérfana ni con una
+    excepción sin recuperar); si no llegó a enviarse, responde con un mensaje nuevo.
+    """
+    if processing_task is not None:
+        try:
+            processing_msg = await processing_task
+            await processing_msg.edit_text(mensaje)
+            return
+        except Exception as e:
+            logger.error("❌ No se pudo mostrar el error en el placeholder: %s", e)
+    await update.message.reply_text(mensaje)
+
+
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Procesa notas de voz."""
     _ensure_chat_id_persisted(update)
     chat_id = str(update.effective_chat.id)
     message_id = str(update.message.message_id)
 
-    logger.info(f"🎤 Nota de voz recibida (message_id: {message_id})")
+    logger.info("🎤 Nota de voz recibida (message_id: %s)", message_id)
+
+    # Reintento de Telegram de un audio ya cargado: no descargar ni transcribir
+    if asana_client.ya_procesado(message_id, "telegram_voz"):
+        logger.info("⏭️ Audio %s ya procesado, no se reclasifica", message_id)
+        await update.message.reply_text("⏭️ Este audio ya fue procesado anteriormente.")
+        return
 
+    processing_task: asyncio.Task | None = None
     try:
+        # Notificar que estamos procesando mientras se descarga el audio:
+        # el usuario ve feedback sin esperar a que lleguen los bytes
+        processing_task = asyncio.create_task(
+            update.message.reply_text("🎤 Transcribiendo audio...")
+        )
+
         # Descargar audio
         voice = await update.message.voice.get_file()
-        audio_bytes = await voice.download_as_bytearray()
-
-        # Notificar que estamos procesando
-        processing_msg = await update.message.reply_text("🎤 Transcribiendo audio...")
+        audio_buffer = await _descargar_audio(voice)
+        processing_msg = await processing_task
 
         # Transcribir
-        texto = transcribir_audio(bytes(audio_bytes))
+        texto = await asyncio.to_thread(transcribir_audio, audio_buffer)
 
         # Añadir al historial
         _agregar_mensaje_historial(chat_id, "user", texto)
 
         # Clasificar
-        clasificacion = clasificar_mensaje(historial_conversaciones[chat_id])
+        clasificacion = await asyncio.to_thread(
+            clasificar_mensaje, list(historial_conversaciones[chat_id])
+        )
 
         intent = clasificacion.get("intent", "guardar_tarea_asana")
 
         if intent == "analizar_patrones":
             await processing_msg.edit_text("⏳ Extrayendo historial de Asana y analizando patrones...")
             query = clasificacion.get("query", texto)
-            datos_historicos = asana_client.obtener_datos_historicos_analisis(dias=30)
-            respuesta_analisis = generar_analisis_patrones(query, datos_historicos)
+            datos_historicos = await asyncio.to_thread(asana_client.obtener_datos_historicos_analisis, dias=30)
+            respuesta_analisis = await asyncio.to_thread(generar_analisis_patrones, query, datos_historicos)
             
             chunks = _split_long_message(respuesta_analisis)
             await processing_msg.edit_text(chunks[0])
@@ -391,13 +528,13 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         elif intent == "ver_deadlines":
             await processing_msg.delete()
-            texto_deadlines = _formatear_deadlines()
+            texto_deadlines = await asyncio.to_thread(_formatear_deadlines)
             await update.message.reply_text(texto_deadlines)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré los deadlines próximos.")
             return
         elif intent == "ver_resumen":
             await processing_msg.delete()
-            texto_resumen = _formatear_resumen_semanal()
+            texto_resumen = await asyncio.to_thread(_formatear_resumen_semanal)
             await update.message.reply_text(texto_resumen)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré el resumen semanal.")
             return
@@ -406,7 +543,8 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         task_gid = clasificacion.get("task_gid")
 
         if accion == "actualizar" and task_gid:
-            task = asana_client.actualizar_tarea(
+            task = await asyncio.to_thread(
+                asana_client.actualizar_tarea,
                 task_gid=task_gid,
                 clasificacion=clasificacion,
             )
@@ -421,7 +559,8 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 _agregar_mensaje_historial(chat_id, "assistant", respuesta)
         else:
             # Crear tarea nueva
-            task = asana_client.crear_tarea(
+            task = await asyncio.to_thread(
+                asana_client.crear_tarea,
                 texto=texto,
                 clasificacion=clasificacion,
                 message_id=message_id,
@@ -442,8 +581,10 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await processing_msg.edit_text(respuesta)
 
     except Exception as e:
-        logger.error(f"Error procesando voz: {e}")
-        await update.message.reply_text(f"❌ Error procesando audio: {str(e)[:100]}")
+        logger.error("Error procesando voz: %s", e)
+        await _responder_error_audio(
+            update, processing_task, f"❌ Error procesando audio: {str(e)[:100]}"
+        )
 
 
 async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -452,29 +593,42 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
     message_id = str(update.message.message_id)
 
-    logger.info(f"🎵 Audio recibido (message_id: {message_id})")
+    logger.info("🎵 Audio recibido (message_id: %s)", message_id)
+
+    # Reintento de Telegram de un audio ya cargado: no descargar ni transcribir
+    if asana_client.ya_procesado(message_id, "telegram_audio"):
+        logger.info("⏭️ Audio %s ya procesado, no se reclasifica", message_id)
+        await update.message.reply_text("⏭️ Este audio ya fue procesado anteriormente.")
+        return
 
+    processing_task: asyncio.Task | None = None
     try:
+        # Placeholder y descarga en paralelo
+        processing_task = asyncio.create_task(
+            update.message.reply_text("🎵 Transcribiendo audio...")
+        )
+
         audio = await update.message.audio.get_file()
-        audio_bytes = await audio.download_as_bytearray()
+        audio_buffer = await _descargar_audio(audio)
         filename = update.message.audio.file_name or "audio.ogg"
+        processing_msg = await processing_task
 
-        processing_msg = await update.message.reply_text("🎵 Transcribiendo audio...")
-
-        texto = transcribir_audio(bytes(audio_bytes), filename)
+        texto = await asyncio.to_thread(transcribir_audio, audio_buffer, filename)
         
         # Añadir al historial
         _agregar_mensaje_historial(chat_id, "user", texto)
 
-        clasificacion = clasificar_mensaje(historial_conversaciones[chat_id])
+        clasificacion = await asyncio.to_thread(
+            clasificar_mensaje, list(historial_conversaciones[chat_id])
+        )
 
         intent = clasificacion.get("intent", "guardar_tarea_asana")
 
         if intent == "analizar_patrones":
             await processing_msg.edit_text("⏳ Extrayendo historial de Asana y analizando patrones...")
             query = clasificacion.get("query", texto)
-            datos_historicos = asana_client.obtener_datos_historicos_analisis(dias=30)
-            respuesta_analisis = generar_analisis_patrones(query, datos_historicos)
+            datos_historicos = await asyncio.to_thread(asana_client.obtener_datos_historicos_analisis, dias=30)
+            respuesta_analisis = await asyncio.to_thread(generar_analisis_patrones, query, datos_historicos)
             
             chunks = _split_long_message(respuesta_analisis)
             await processing_msg.edit_text(chunks[0])
@@ -500,13 +654,13 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         elif intent == "ver_deadlines":
             await processing_msg.delete()
-            texto_deadlines = _formatear_deadlines()
+            texto_deadlines = await asyncio.to_thread(_formatear_deadlines)
             await update.message.reply_text(texto_deadlines)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré los deadlines próximos.")
             return
         elif intent == "ver_resumen":
             await processing_msg.delete()
-            texto_resumen = _formatear_resumen_semanal()
+            texto_resumen = await asyncio.to_thread(_formatear_resumen_semanal)
             await update.message.reply_text(texto_resumen)
             _agregar_mensaje_historial(chat_id, "assistant", "Te mostré el resumen semanal.")
             return
@@ -515,7 +669,8 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         task_gid = clasificacion.get("task_gid")
 
         if accion == "actualizar" and task_gid:
-            task = asana_client.actualizar_tarea(
+            task = await asyncio.to_thread(
+                asana_client.actualizar_tarea,
                 task_gid=task_gid,
                 clasificacion=clasificacion,
             )
@@ -530,7 +685,8 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 _agregar_mensaje_historial(chat_id, "assistant", respuesta)
         else:
             # Crear tarea nueva
-            task = asana_client.crear_tarea(
+            task = await asyncio.to_thread(
+                asana_client.crear_tarea,
                 texto=texto,
                 clasificacion=clasificacion,
                 message_id=message_id,
@@ -549,8 +705,10 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await processing_msg.edit_text(respuesta)
 
     except Exception as e:
-        logger.error(f"Error procesando audio: {e}")
-        await update.message.reply_text(f"❌ Error procesando audio: {str(e)[:100]}")
+        logger.error("Error procesando audio: %s", e)
+        await _responder_error_audio(
+            update, processing_task, f"❌ Error procesando audio: {str(e)[:100]}"
+        )
 
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -574,7 +732,8 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cmd_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /refresh — recarga IDs de Asana."""
     try:
-        asana_client.refresh_ids()
+        await asyncio.to_thread(asana_client.refresh_ids)
+        _invalidar_resumen_cache()
         await update.message.reply_text("🔄 IDs de Asana recargados correctamente.")
     except Exception as e:
         await update.message.reply_text(f"❌ Error recargando: {str(e)[:100]}")
@@ -584,10 +743,10 @@ async def cmd_deadlines(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /deadlines — muestra tareas con vencimiento en 24/48 horas."""
     _ensure_chat_id_persisted(update)
     try:
-        texto = _formatear_deadlines()
+        texto = await asyncio.to_thread(_formatear_deadlines)
         await update.message.reply_text(texto)
     except Exception as e:
-        logger.error(f"Error generando reporte de deadlines: {e}")
+        logger.error("Error generando reporte de deadlines: %s", e)
         await update.message.reply_text(
             f"❌ Error generando reporte de deadlines: {str(e)[:150]}"
         )
@@ -597,10 +756,10 @@ async def cmd_resumen(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /resumen — envía resumen semanal."""
     _ensure_chat_id_persisted(update)
     try:
-        texto = _formatear_resumen_semanal()
+        texto = await asyncio.to_thread(_formatear_resumen_semanal)
         await update.message.reply_text(texto)
     except Exception as e:
-        logger.error(f"Error generando resumen semanal: {e}")
+        logger.error("Error generando resumen semanal: %s", e)
         await update.message.reply_text(
             f"❌ Error generando resumen semanal: {str(e)[:150]}"
         )
@@ -624,8 +783,8 @@ async def cmd_analizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         processing_msg = await update.message.reply_text("⏳ Extrayendo historial de Asana y analizando patrones directamente...")
         
         # Obtener datos y generar análisis (bypass classifier)
-        datos_historicos = asana_client.obtener_datos_historicos_analisis(dias=30)
-        respuesta_analisis = generar_analisis_patrones(query, datos_historicos)
+        datos_historicos = await asyncio.to_thread(asana_client.obtener_datos_historicos_analisis, dias=30)
+        respuesta_analisis = await asyncio.to_thread(generar_analisis_patrones, query, datos_historicos)
         
         # Enviar respuesta en chunks si es necesario
         chunks = _split_long_message(respuesta_analisis)
@@ -640,14 +799,14 @@ async def cmd_analizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         _agregar_mensaje_historial(chat_id, "assistant", f"[Análisis directo ejecutado para: {query}]")
 
     except Exception as e:
-        logger.error(f"Error en comando /analizar: {e}")
+        logger.error("Error en comando /analizar: %s", e)
         await update.message.reply_text(f"❌ Error ejecutando análisis: {str(e)[:150]}")
 
 
 async def _cmd_listar_seccion(update: Update, nombre_seccion: str, titulo: str):
     """Helper para /hoy y /semana."""
     try:
-        tareas = asana_client.listar_tareas_seccion(nombre_seccion)
+        tareas = await asyncio.to_thread(asana_client.listar_tareas_seccion, nombre_seccion)
 
         if not tareas:
             if nombre_seccion == "Hoy":
@@ -661,13 +820,13 @@ async def _cmd_listar_seccion(update: Update, nombre_seccion: str, titulo: str):
         lineas = [f"{titulo} ({len(tareas)})"]
         for t in tareas:
             lineas.append(
-                f"{t['emoji_prioridad']} {t['proyecto']} — {t['name']}"
+                f"{t.emoji_prioridad} {t.proyecto} — {t.name}"
             )
 
-        await update.message.reply_text("\n".join(lineas))
+        await _responder_en_partes(update, "\n".join(lineas))
 
     except Exception as e:
-        logger.error(f"Error listando tareas de sección {nombre_seccion}: {e}")
+        logger.error("Error listando tareas de sección %s: %s", nombre_seccion, e)
         await update.message.reply_text(f"❌ Error consultando tareas: {str(e)[:100]}")
 
 
@@ -681,14 +840,26 @@ async def cmd_semana(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _cmd_listar_seccion(update, "Semana", "📋 Tareas para esta semana")
 
 
+def _normalizar_busqueda(texto: str) -> str:
+    """Normaliza para el match de /done: sin tildes, minúsculas y sin puntuación."""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c)
+    )
+    return utils.default_process(sin_tildes)
+
+
 async def cmd_done_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Entrada al flujo /done."""
     texto_args = " ".join(context.args).strip() if getattr(context, "args", None) else ""
 
-    # Construir lista de tareas de Hoy, Semana y Backlog
-    tareas = []
-    for seccion in ("Hoy", "Semana", "Backlog"):
-        tareas.extend(asana_client.listar_tareas_seccion(seccion))
+    # Construir lista de tareas de Hoy, Semana y Backlog (las tres en paralelo)
+    resultados = await asyncio.gather(
+        *(
+            asyncio.to_thread(asana_client.listar_tareas_seccion, seccion)
+            for seccion in ("Hoy", "Semana", "Backlog")
+        )
+    )
+    tareas = [t for tareas_seccion in resultados for t in tareas_seccion]
 
     if not tareas:
         await update.message.reply_text("🎉 No tenés tareas pendientes")
@@ -696,40 +867,52 @@ async def cmd_done_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data["done_tasks"] = tareas
 
-    # Modo búsqueda por texto
+    # Modo búsqueda por texto (fuzzy: tolera typos y palabras en otro orden)
     if texto_args:
-        query = texto_args.lower()
-        mejor = None
-        mejor_score = 0.0
+        match = process.extractOne(
+            texto_args,
+            [t.name for t in tareas],
+            scorer=fuzz.WRatio,
+            processor=_normalizar_busqueda,
+            score_cutoff=_DONE_FUZZY_CUTOFF,
+        )
 
-        for t in tareas:
-            name_l = t["name"].lower()
-            score = 0.0
-            if query in name_l:
-                # Puntaje simple: proporción de match
-                score = len(query) / max(len(name_l), 1)
-            if score > mejor_score:
-                mejor_score = score
-                mejor = t
-
-        if not mejor or mejor_score == 0:
+        if not match:
             await update.message.reply_text("❌ No encontré ninguna tarea que matchee ese texto.")
             return ConversationHandler.END
 
+        mejor = tareas[match[2]]
+
         context.user_data["done_selected_task"] = mejor
         await update.message.reply_text(
-            f"¿Confirmás completar: {mejor['name']}? (Sí/No)"
+            f"¿Confirmás completar: {mejor.name}? (Sí/No)"
         )
         return DONE_WAITING_CONFIRMATION
 
+    # Modo botones: un toque elige la tarea, sin tipear el número
+    if len(tareas) <= _DONE_MAX_BOTONES:
+        teclado = InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        f"{t.emoji_prioridad} {t.seccion} — {t.name[:_DONE_LARGO_BOTON]}",
+                        callback_data=f"done:{t.gid}",
+                    )
+                ]
+                for t in tareas
+            ]
+        )
+        await update.message.reply_text("📋 ¿Cuál completaste?", reply_markup=teclado)
+        return DONE_WAITING_SELECTION
+
     # Modo listado numerado
     lineas = ["📋 ¿Cuál completaste?", ""]
     for idx, t in enumerate(tareas, start=1):
         lineas.append(
-            f"{idx}. {t['emoji_prioridad']} {t['seccion']} — {t['name']}"
+            f"{idx}. {t.emoji_prioridad} {t.seccion} — {t.name}"
         )
 
-    await update.message.reply_text("\n".join(lineas))
+    await _responder_en_partes(update, "\n".join(lineas))
     return DONE_WAITING_SELECTION
 
 
@@ -738,14 +921,15 @@ async def done_receive_index(update: Update, context: ContextTypes.DEFAULT_TYPE)
     tareas = context.user_data.get("done_tasks") or []
     mensaje = (update.message.text or "").strip()
 
-    if not mensaje.isdigit():
+    try:
+        idx = int(mensaje)
+    except ValueError:
         await update.message.reply_text(
             "Decime un número válido (por ejemplo, 1) o /cancel para salir."
         )
         return DONE_WAITING_SELECTION
 
-    idx = int(mensaje)
-    if idx < 1 or idx > len(tareas):
+    if not 1 <= idx <= len(tareas):
         await update.message.reply_text(
             f"El número debe estar entre 1 y {len(tareas)}. Probá de nuevo."
         )
@@ -755,29 +939,51 @@ async def done_receive_index(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data["done_selected_task"] = seleccionada
 
     await update.message.reply_text(
-        f"¿Confirmás completar: {seleccionada['name']}? (Sí/No)"
+        f"¿Confirmás completar: {seleccionada.name}? (Sí/No)"
     )
     return DONE_WAITING_CONFIRMATION
 
 
+async def done_receive_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recibe la tarea elegida con un botón del listado de /done."""
+    query = update.callback_query
+    await query.answer()
+
+    gid = query.data.split(":", 1)[1]
+    tareas = context.user_data.get("done_tasks") or []
+    seleccionada = next((t for t in tareas if t.gid == gid), None)
+    if seleccionada is None:
+        await query.edit_message_text("❌ Esa tarea ya no está en la lista. Probá /done de nuevo.")
+        return ConversationHandler.END
+
+    context.user_data["done_selected_task"] = seleccionada
+    await query.edit_message_text(f"¿Confirmás completar: {seleccionada.name}? (Sí/No)")
+    return DONE_WAITING_CONFIRMATION
+
+
+async def done_callback_vencido(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Responde a un botón de /done apretado fuera del flujo (terminado o tras un reinicio)."""
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text("⌛ Este listado ya no está activo. Probá /done de nuevo.")
+
+
 async def done_receive_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Confirma o cancela la finalización de la tarea."""
-    texto = (update.message.text or "").strip().lower()
+    texto = (update.message.text or "").strip().casefold()
     seleccionada = context.user_data.get("done_selected_task")
 
     if not seleccionada:
         await update.message.reply_text("No hay ninguna tarea seleccionada.")
         return ConversationHandler.END
 
-    positivos = {"sí", "si", "s", "yes", "y"}
-    negativos = {"no", "n"}
-
-    if texto in positivos:
+    if texto in _RESPUESTAS_SI:
         try:
-            asana_client.completar_tarea(seleccionada["gid"])
-            await update.message.reply_text(f"✅ Completada: {seleccionada['name']}")
+            await asyncio.to_thread(asana_client.completar_tarea, seleccionada.gid)
+            _invalidar_resumen_cache()
+            await update.message.reply_text(f"✅ Completada: {seleccionada.name}")
         except Exception as e:
-            logger.error(f"Error completando tarea {seleccionada['gid']}: {e}")
+            logger.error("Error completando tarea %s: %s", seleccionada.gid, e)
             await update.message.reply_text(
                 f"❌ Error completando la tarea: {str(e)[:100]}"
             )
@@ -786,7 +992,7 @@ async def done_receive_confirmation(update: Update, context: ContextTypes.DEFAUL
         context.user_data.pop("done_selected_task", None)
         return ConversationHandler.END
 
-    if texto in negativos:
+    if texto in _RESPUESTAS_NO:
         await update.message.reply_text("❌ Cancelado")
         context.user_data.pop("done_tasks", None)
         context.user_data.pop("done_selected_task", None)
@@ -807,41 +1013,31 @@ async def cmd_done_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def _enviar_deadlines_programado(context: ContextTypes.DEFAULT_TYPE):
     """Job de JobQueue: envía reporte de deadlines de lunes a viernes a las 9 AM."""
     try:
-        if not CHAT_ID_FILE.exists():
-            logger.info("ℹ️ No hay chat_id configurado, no se envían deadlines.")
-            return
-
-        data = json.loads(CHAT_ID_FILE.read_text(encoding="utf-8"))
-        chat_id = data.get("chat_id")
+        chat_id = _leer_chat_id()
         if not chat_id:
-            logger.warning("⚠️ chat_id.json no contiene 'chat_id'")
+            logger.info("ℹ️ No hay chat_id configurado, no se envían deadlines.")
             return
 
-        texto = _formatear_deadlines()
+        texto = await asyncio.to_thread(_formatear_deadlines)
         await context.bot.send_message(chat_id=chat_id, text=texto)
         logger.info("✅ Reporte de deadlines enviado automáticamente por JobQueue")
     except Exception as e:
-        logger.error(f"❌ Error enviando reporte de deadlines automático: {e}")
+        logger.error("❌ Error enviando reporte de deadlines automático: %s", e)
 
 
 async def _enviar_resumen_programado(context: ContextTypes.DEFAULT_TYPE):
     """Job de JobQueue: envía el resumen semanal al chat configurado."""
     try:
-        if not CHAT_ID_FILE.exists():
-            logger.info("ℹ️ No hay chat_id configurado, no se envía resumen semanal.")
-            return
-
-        data = json.loads(CHAT_ID_FILE.read_text(encoding="utf-8"))
-        chat_id = data.get("chat_id")
+        chat_id = _leer_chat_id()
         if not chat_id:
-            logger.warning("⚠️ chat_id.json no contiene 'chat_id'")
+            logger.info("ℹ️ No hay chat_id configurado, no se envía resumen semanal.")
             return
 
-        texto = _formatear_resumen_semanal()
+        texto = await asyncio.to_thread(_formatear_resumen_semanal)
         await context.bot.send_message(chat_id=chat_id, text=texto)
         logger.info("✅ Resumen semanal enviado automáticamente por JobQueue")
     except Exception as e:
-        logger.error(f"❌ Error enviando resumen semanal automático: {e}")
+        logger.error("❌ Error enviando resumen semanal automático: %s", e)
 
 
 # ── Health Server ─────────────────────────────────────────────────────────────
@@ -863,7 +1059,7 @@ def start_health_server():
     from .config import logger
     port = int(os.getenv("PORT", 8080))
     server = HTTPServer(("0.0.0.0", port), HealthHandler)
-    logger.info(f"Health server corriendo en :{port}/health")
+    logger.info("Health server corriendo en :%s/health", port)
     server.serve_forever()
 
 
@@ -872,7 +1068,13 @@ def run_bot():
     global asana_client
 
     logger.info("🚀 Inicializando Jarvis...")
-    
+
+    # Loop basado en libuv: menos overhead por await en un bot 100% I/O.
+    # run_polling crea el loop a partir de la policy, así que va antes de todo.
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("⚡ Usando uvloop como event loop")
+
     # Health server en thread separado
     health_thread = threading.Thread(target=start_health_server, daemon=True)
     health_thread.start()
@@ -885,26 +1087,35 @@ def run_bot():
 
     # Callback post_init para registrar jobs en el JobQueue
     async def _post_init(app: Application):
-        tz = ZoneInfo("America/Argentina/Buenos_Aires")
         # Lunes a viernes (0-4) a las 9:00 hora Argentina
         app.job_queue.run_daily(
             _enviar_deadlines_programado,
-            time(hour=9, minute=0, tzinfo=tz),
+            _HORA_DEADLINES,
             days=(0, 1, 2, 3, 4),
             name="deadlines_diarios",
         )
         # Viernes (4) a las 18:00 hora Argentina
         app.job_queue.run_daily(
             _enviar_resumen_programado,
-            time(hour=18, minute=0, tzinfo=tz),
+            _HORA_RESUMEN,
             days=(4,),
             name="resumen_semanal_telegram",
         )
 
     # Construir app de Telegram
+    # Pool amplio + HTTP/2 para las llamadas a la Bot API (reply, edit, descargas):
+    # las respuestas del handler en curso y los envíos de los jobs programados
+    # no se encolan esperando una conexión libre.
+    # El long polling de getUpdates sigue con su propio pool en HTTP/1.1.
+    # Sin concurrent_updates a propósito: el flujo /done, el historial y los
+    # "actualizar" de seguimiento dependen de procesar los updates en orden.
     app = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
+        .connection_pool_size(32)
+        .pool_timeout(5)
+        .read_timeout(30)
+        .http_version("2")
         .post_init(_post_init)
         .build()
     )
@@ -915,27 +1126,33 @@ def run_bot():
     app.add_handler(CommandHandler("deadlines", cmd_deadlines))
     app.add_handler(CommandHandler("resumen", cmd_resumen))
     app.add_handler(CommandHandler("analizar", cmd_analizar))
-    app.add_handler(
-        ConversationHandler(
+    # per_message=False es lo correcto: el flujo arranca con /done (un mensaje) y la
+    # confirmación es texto, así que el estado se sigue por chat y no por mensaje.
+    # PTB igual avisa por tener un CallbackQueryHandler adentro; se silencia acá.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*CallbackQueryHandler", category=PTBUserWarning)
+        done_handler = ConversationHandler(
             entry_points=[CommandHandler("done", cmd_done_entry)],
             states={
                 DONE_WAITING_SELECTION: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, done_receive_index)
+                    CallbackQueryHandler(done_receive_callback, pattern=r"^done:"),
+                    MessageHandler(_TEXT_NO_CMD, done_receive_index),
                 ],
                 DONE_WAITING_CONFIRMATION: [
-                    MessageHandler(
-                        filters.TEXT & ~filters.COMMAND, done_receive_confirmation
-                    )
+                    MessageHandler(_TEXT_NO_CMD, done_receive_confirmation)
                 ],
             },
             fallbacks=[CommandHandler("cancel", cmd_done_cancel)],
+            per_message=False,
         )
-    )
+    app.add_handler(done_handler)
+    # Botones de /done que llegan con el flujo ya cerrado: contestar igual la query
+    app.add_handler(CallbackQueryHandler(done_callback_vencido, pattern=r"^done:"))
     app.add_handler(CommandHandler("hoy", cmd_hoy))
     app.add_handler(CommandHandler("semana", cmd_semana))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    app.add_handler(MessageHandler(_TEXT_NO_CMD, handle_text))
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
     app.add_handler(MessageHandler(filters.AUDIO, handle_audio))
 
     logger.info("🤖 Jarvis escuchando en Telegram...")
-    app.run_polling(allowed_updates=["message"])
+    app.run_polling(allowed_updates=["message", "callback_query"])
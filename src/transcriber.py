@@ -1,45 +1,140 @@
 """Transcripción de audio con OpenAI Whisper."""
 
-import os
-import tempfile
+import functools
+import hashlib
+import io
+import sqlite3
+import threading
+from collections import OrderedDict
 import openai
-from .config import OPENAI_API_KEY, logger
+from .config import OPENAI_API_KEY, TRANSCRIPCIONES_DB, logger
 
+# Transcripciones recientes en memoria (LRU) delante de la cache sqlite
+_CACHE_MEMORIA_MAX = 256
+_cache_memoria: OrderedDict[str, str] = OrderedDict()
 
-def transcribir_audio(audio_bytes: bytes, filename: str = "audio.ogg") -> str:
+# La conexión sqlite y la LRU se comparten entre threads: serializar el acceso
+_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client() -> openai.OpenAI:
+    """Cliente de OpenAI compartido (reutiliza el pool de conexiones HTTP)."""
+    return openai.OpenAI(api_key=OPENAI_API_KEY)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_cache_db() -> sqlite3.Connection:
+    """Conexión a la cache de transcripciones (se crea la tabla si no existe)."""
+    conn = sqlite3.connect(TRANSCRIPCIONES_DB, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS transcripciones (hash TEXT PRIMARY KEY, texto TEXT NOT NULL)"
+    )
+    conn.commit()
+    return conn
+
+
+def _hash_audio(audio_bytes: bytes | memoryview) -> str:
+    """Clave de cache: blake2b de 128 bits sobre los bytes del audio."""
+    return hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+
+
+def _recordar(clave: str, texto: str):
+    """Agrega una transcripción a la LRU en memoria (llamar con el lock tomado)."""
+    _cache_memoria[clave] = texto
+    _cache_memoria.move_to_end(clave)
+    if len(_cache_memoria) > _CACHE_MEMORIA_MAX:
+        _cache_memoria.popitem(last=False)
+
+
+def _transcripcion_cacheada(clave: str) -> str | None:
+    """Busca una transcripción previa del mismo audio (memoria y luego sqlite)."""
+    with _cache_lock:
+        texto = _cache_memoria.get(clave)
+        if texto is not None:
+            _cache_memoria.move_to_end(clave)
+            return texto
+
+        fila = _get_cache_db().execute(
+            "SELECT texto FROM transcripciones WHERE hash = ?", (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        _recordar(clave, fila[0])
+        return fila[0]
+
+
+def _guardar_transcripcion(clave: str, texto: str):
+    """Guarda una transcripción en la cache (memoria y sqlite)."""
+    with _cache_lock:
+        _recordar(clave, texto)
+        conn = _get_cache_db()
+        conn.execute(
+            "INSERT OR REPLACE INTO transcripciones (hash, texto) VALUES (?, ?)",
+            (clave, texto),
+        )
+        conn.commit()
+
+
+def transcribir_audio(audio: bytes | io.BytesIO, filename: str = "audio.ogg") -> str:
     """
     Transcribe audio usando OpenAI Whisper API.
+
+    Si el mismo audio ya se transcribió (ej: una nota de voz reenviada),
+    devuelve el texto cacheado sin volver a llamar a Whisper.
     
     Args:
-        audio_bytes: Contenido del archivo de audio en bytes
+        audio: Contenido del audio: bytes, o el BytesIO de la descarga de
+            Telegram, que se envía a Whisper tal cual (sin copiar)
         filename: Nombre del archivo (para detectar extensión)
     
     Returns:
         Texto transcrito
     """
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    if isinstance(audio, io.BytesIO):
+        audio_file = audio
+        with audio.getbuffer() as vista:
+            clave = _hash_audio(vista)
+            tamano = len(vista)
+    else:
+        clave = _hash_audio(audio)
+        tamano = len(audio)
+        # BytesIO comparte el objeto bytes mientras nadie escriba: no copia
+        audio_file = io.BytesIO(audio)
+
+    try:
+        cacheado = _transcripcion_cacheada(clave)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ No se pudo leer la cache de transcripciones: %s", e)
+        cacheado = None
+    if cacheado is not None:
+        logger.info("Audio transcrito desde cache (%s bytes): %.100s...", tamano, cacheado)
+        return cacheado
+
+    client = _get_client()
 
     extension = filename.split(".")[-1] if "." in filename else "ogg"
 
-    with tempfile.NamedTemporaryFile(suffix=f".{extension}", delete=False) as f:
-        f.write(audio_bytes)
-        temp_path = f.name
+    # El SDK acepta un file-like en memoria: el nombre le indica el formato
+    audio_file.seek(0)
+    audio_file.name = f"audio.{extension}"
 
     try:
-        with open(temp_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="es",  # Forzar español para mejor accuracy
-            )
+        transcription = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            language="es",  # Forzar español para mejor accuracy
+        )
 
         texto = transcription.text.strip()
-        logger.info(f"Audio transcrito ({len(audio_bytes)} bytes): {texto[:100]}...")
-        return texto
+        logger.info("Audio transcrito (%s bytes): %.100s...", tamano, texto)
 
     except Exception as e:
-        logger.error(f"Error transcribiendo audio: {e}")
+        logger.error("Error transcribiendo audio: %s", e)
         raise
 
-    finally:
-        os.unlink(temp_path)
+    try:
+        _guardar_transcripcion(clave, texto)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ No se pudo guardar la transcripción en cache: %s", e)
+    return texto